@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+# ビルドの比較用ベンチマーク（サイズと起動時間）
+# 例: python bench_build.py dist/youtube.exe dist/youtube_slim.exe -n 5
+# アプリを YOUTUBEDL_STARTUP_REPORT 付きで起動し、ウィンドウ表示と yt_dlp の読み込みが
+# 終わった時点で自動終了させて、その間の時間を測る
+# 1回目（cold: 展開先やOSのファイルキャッシュが温まっていない状態）と
+# 2回目以降の中央値（warm）を分けて表示する
+def build_size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path)
+
+# 一時フォルダを作業ディレクトリにして起動する（logs などを残さないため。cmd は絶対パスで渡す）
+# 起動に失敗した場合や、起動時間の記録が書かれなかった場合は RuntimeError（その時間は計測値にしない）
+def launch(cmd, timeout):
+    with tempfile.TemporaryDirectory() as tmp:
+        report = os.path.join(tmp, "startup.json")
+        env = dict(os.environ, YOUTUBEDL_STARTUP_REPORT=report)
+        t0 = time.perf_counter()
+        try:
+            result = subprocess.run(cmd, env=env, timeout=timeout, cwd=tmp,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise RuntimeError(str(e))
+        wall = (time.perf_counter() - t0) * 1000
+        if result.returncode != 0 or not os.path.exists(report):
+            lines = result.stderr.decode(errors="replace").strip().splitlines()
+            detail = f": {lines[-1]}" if lines else ""
+            if result.returncode != 0:
+                raise RuntimeError(f"終了コード {result.returncode}{detail}")
+            raise RuntimeError(f"起動時間の記録が書き出されませんでした{detail}")
+        with open(report, encoding="utf-8") as f:
+            marks = json.load(f)
+        return wall, marks
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ビルドごとのサイズと起動時間を比較する")
+    parser.add_argument("targets", nargs="+", help="exe のパス、onedir のフォルダ、または youtube.py")
+    parser.add_argument("-n", "--runs", type=int, default=5, help="起動回数（既定: 5、1回目は cold として別に集計）")
+    parser.add_argument("--timeout", type=float, default=120, help="1回あたりのタイムアウト秒数")
+    args = parser.parse_args(argv)
+
+    print(f"{'target':40} {'size(MB)':>9} {'cold(ms)':>9} {'warm(ms)':>9} {'window(ms)':>11} {'yt_dlp(ms)':>11}")
+    failed = False
+    for target in args.targets:
+        if not os.path.exists(target):
+            print(f"{target:40} 失敗: 見つかりません", file=sys.stderr)
+            failed = True
+            continue
+        if target.endswith(".py"):
+            cmd = [sys.executable, os.path.abspath(target)]
+            size = build_size(target)
+        else:
+            exe = target
+            if os.path.isdir(target):
+                exe = os.path.join(target, os.path.basename(target.rstrip("\\/")) + (".exe" if os.name == "nt" else ""))
+            cmd = [os.path.abspath(exe)]
+            size = build_size(target)
+        walls, windows, loads = [], [], []
+        try:
+            for _ in range(args.runs):
+                wall, marks = launch(cmd, args.timeout)
+                walls.append(wall)
+                if "window_shown" in marks:
+                    windows.append(marks["window_shown"])
+                if "yt_dlp_loaded" in marks:
+                    loads.append(marks["yt_dlp_loaded"])
+        except RuntimeError as e:
+            print(f"{target:40} 失敗: {e}", file=sys.stderr)
+            failed = True
+            continue
+        median = lambda values: f"{statistics.median(values):.0f}" if values else "-"
+        cold, warm = walls[0], walls[1:]
+        print(f"{target:40} {size / 1024 / 1024:9.1f} {cold:9.0f} {median(warm):>9} "
+              f"{median(windows[1:]):>11} {median(loads[1:]):>11}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+import tempfile
+from downloader import AUDIO_EXTS, AUDIO_PROFILES, AUDIO_REMUX_EXTS, run_ffmpeg
+
+# 変換プロファイルごとのエンコード速度と出力サイズの比較
+# 例: python bench_profiles.py downloads/sample.mp4
+#     python bench_profiles.py --seconds 300        （入力を省略すると ffmpeg で試験音を生成する）
+# 実際の変換と同じ run_ffmpeg を使い、各プロファイルを -n 回実行した最短時間を表示する
+def generate_source(path, seconds):
+    # 単音だと圧縮されすぎるため、ノイズを混ぜたステレオ音声を作る
+    subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "lavfi",
+         "-i", f"sine=frequency=440:duration={seconds}", "-f", "lavfi",
+         "-i", f"anoisesrc=color=pink:amplitude=0.2:duration={seconds}",
+         "-filter_complex", "amix=inputs=2,aformat=channel_layouts=stereo", "-ar", "48000",
+         "-c:a", "pcm_s16le", "-y", path],
+        check=True,
+    )
+
+def probe_duration(path):
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=nw=1:nk=1", path],
+            capture_output=True, text=True,
+        )
+        return float(result.stdout.strip())
+    except (OSError, ValueError):
+        # ffprobe がない環境では速度・ビットレートを表示しない
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="変換プロファイルごとのエンコード速度と出力サイズを比較する")
+    parser.add_argument("input", nargs="?", help="変換元のファイル（省略時は試験音を生成）")
+    parser.add_argument("--seconds", type=int, default=180, help="生成する試験音の長さ（秒、既定: 180）")
+    parser.add_argument("-p", "--profiles", nargs="+", choices=list(AUDIO_PROFILES), default=list(AUDIO_PROFILES),
+                        help="比較するプロファイル（既定: すべて）")
+    parser.add_argument("-n", "--runs", type=int, default=3, help="プロファイルごとの実行回数（既定: 3）")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = args.input
+        if source is None:
+            source = os.path.join(tmp, "source.wav")
+            generate_source(source, args.seconds)
+            duration = args.seconds
+        else:
+            duration = probe_duration(source)
+        src_ext = os.path.splitext(source)[1].lstrip(".").lower()
+
+        print(f"{'profile':12} {'time(s)':>8} {'x realtime':>11} {'size(MB)':>9} {'kbps':>7}")
+        for name in args.profiles:
+            _, ext, codec_args = AUDIO_PROFILES[name]
+            if ext is None:
+                # copy は元の音声形式に合うコンテナが必要（音声ファイルならそのままの形式）
+                ext = src_ext if src_ext in AUDIO_EXTS else AUDIO_REMUX_EXTS.get(src_ext, "m4a")
+            out_file = os.path.join(tmp, f"{name}.{ext}")
+            times = []
+            try:
+                for _ in range(args.runs):
+                    t0 = time.perf_counter()
+                    run_ffmpeg(["ffmpeg", "-i", source, "-vn", *codec_args, "-y", out_file], duration)
+                    times.append(time.perf_counter() - t0)
+            except RuntimeError as e:
+                print(f"{name:12} 失敗: {e}", file=sys.stderr)
+                continue
+            best = min(times)
+            size = os.path.getsize(out_file)
+            realtime = f"{duration / best:10.1f}x" if duration else f"{'-':>11}"
+            kbps = f"{size * 8 / duration / 1000:7.0f}" if duration else f"{'-':>7}"
+            print(f"{name:12} {best:8.2f} {realtime} {size / 1024 / 1024:9.2f} {kbps}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
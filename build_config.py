@@ -0,0 +1,18 @@
+# PyInstaller の軽量ビルド用設定（youtube_slim.spec などから読み込む）
+# 実行時に到達しないことを確認したモジュールを除外し、onefile の展開量を減らす
+EXCLUDES = [
+    # ビルド・パッケージ管理用（実行時は不要）
+    "setuptools", "_distutils_hack", "pkg_resources", "distutils", "pip",
+    # 開発・対話用の標準ライブラリ
+    "unittest", "doctest", "pydoc", "pydoc_data", "tkinter", "lib2to3", "xmlrpc", "pyreadline3",
+    # yt_dlp の依存関係経由で紛れ込むが、このアプリでは使わないもの
+    "werkzeug", "markupsafe",
+    # urllib3 の pyOpenSSL 連携用（標準の ssl を使うため不要）
+    "OpenSSL", "cryptography", "cffi", "pycparser",
+    # requests は charset_normalizer があればそれを使う
+    "chardet",
+    # サムネイル埋め込み（EmbedThumbnail）用。このアプリでは使わない
+    "mutagen",
+    # WebSocket を使う抽出器（ニコニコ生放送など）用。YouTube では使わない
+    "websockets", "python_socks",
+]
@@ -0,0 +1,120 @@
+import sys
+import signal
+import argparse
+import threading
+from downloader import (
+    DownloadEngine, AUDIO_PROFILES, create_logger, default_transcode_workers, default_worker_count, load_unfinished_job, parse_tasks,
+    resume_engine_options,
+    MAX_SEGMENTS, MAX_TRANSCODE_WORKERS, MAX_WORKERS_LIMIT
+)
+
+# コマンドライン（ヘッドレス）版
+# GUI と同じ「URL,出力名」の形式をファイルまたは標準入力から読み込み、PyQt6 を使わずに実行する
+def build_parser():
+    parser = argparse.ArgumentParser(description="YouTube MP4 & MP3 ダウンローダー（コマンドライン版）")
+    parser.add_argument("input", nargs="?", default="-",
+                        help="URL と出力名を1行ずつカンマ区切りで書いたファイル（省略時または - で標準入力）")
+    parser.add_argument("-o", "--output-dir", default="downloads", help="保存先フォルダ（既定: downloads）")
+    parser.add_argument("--audio-profile", choices=list(AUDIO_PROFILES),
+                        help="音声の変換プロファイル: " + ", ".join(f"{name}={label}" for name, (label, _, _) in AUDIO_PROFILES.items()))
+    parser.add_argument("--mp3", dest="audio_profile", action="store_const", const="mp3",
+                        help="MP3に変換する（--audio-profile mp3 と同じ）")
+    parser.add_argument("--audio-only", action="store_true", help="音声のみ（動画をダウンロードしない）")
+    parser.add_argument("--stream", action="store_true",
+                        help="音声のみの変換で、ダウンロード中のデータを直接 ffmpeg に渡す（中間ファイルを作らない）")
+    parser.add_argument("--keep-source", action="store_true", help="--stream の場合も変換元の音声ファイルを保存する")
+    parser.add_argument("--cookies", help="cookies.txt のパス")
+    parser.add_argument("-j", "--workers", type=int, default=default_worker_count(),
+                        help=f"同時ダウンロード数（1〜{MAX_WORKERS_LIMIT}）")
+    parser.add_argument("-s", "--segments", type=int, default=1,
+                        help=f"1ファイルを分割して同時に取得する接続数（1〜{MAX_SEGMENTS}、既定: 1）")
+    parser.add_argument("--transcode-workers", type=int, default=default_transcode_workers(),
+                        help=f"変換（ffmpeg）の同時実行数（1〜{MAX_TRANSCODE_WORKERS}、既定: CPU数-2）")
+    parser.add_argument("--archive", action="store_true",
+                        help="ダウンロード済みの動画をスキップする（保存先に履歴を記録）")
+    parser.add_argument("--archive-file", help="ダウンロード履歴のファイル（既定: 保存先の .download_archive.sqlite3）")
+    parser.add_argument("--resume", action="store_true",
+                        help="保存先に残っている中断したジョブを再開する（input は読み込まない）")
+    parser.add_argument("--no-journal", action="store_true", help="途中再開用のジョブ記録を作らない")
+    parser.add_argument("--no-disk-check", action="store_true",
+                        help="保存先の空き容量を確認しない（既定では見積もりサイズ分の空きがあるまで開始を待つ）")
+    parser.add_argument("--retries", type=int, default=3, help="一時的なエラー時の再試行回数（既定: 3）")
+    parser.add_argument("--host-rate", type=float, default=2.0,
+                        help="同じホストへの1秒あたりのリクエスト数の上限（0で無制限、既定: 2）")
+    parser.add_argument("--log-dir", default="logs", help="ログの出力先フォルダ（既定: logs）")
+    parser.add_argument("-q", "--quiet", action="store_true", help="進捗を表示しない")
+    return parser
+
+def read_lines(path):
+    if path == "-":
+        return sys.stdin.read().splitlines()
+    with open(path, encoding="utf-8-sig") as f:
+        return f.read().splitlines()
+
+# 処理は別スレッドで実行し、メインスレッドで Ctrl+C とシグナルを受け付ける
+# Ctrl+C でキャンセルする（途中まで取得したファイルは残し、--resume でその続きから再開できる）
+# POSIX では SIGUSR1 で一時停止、SIGUSR2 で再開する（例: kill -USR1 <pid>）
+def run_engine(engine):
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: engine.pause())
+        signal.signal(signal.SIGUSR2, lambda signum, frame: engine.resume())
+    results = []
+    finished = threading.Event()
+
+    def run():
+        try:
+            results.extend(engine.run())
+        finally:
+            finished.set()
+
+    # Thread.join を Ctrl+C で中断すると is_alive() が終了前でも False を返すことがあるため、Event で待つ
+    threading.Thread(target=run, name="engine").start()
+    while not finished.is_set():
+        try:
+            finished.wait(0.5)
+        except KeyboardInterrupt:
+            print("キャンセルしています…（実行中の処理が止まるまで待ちます）", file=sys.stderr, flush=True)
+            engine.cancel()
+    return results
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    engine_options = {"audio_profile": args.audio_profile, "audio_only": args.audio_only, "stream_audio": args.stream,
+                      "keep_source": args.keep_source, "segments": args.segments}
+    if args.resume:
+        unfinished = load_unfinished_job(args.output_dir)
+        if not unfinished:
+            print("エラー: 再開できるジョブがありません", file=sys.stderr)
+            return 2
+        tasks = unfinished["tasks"]
+        engine_options.update(resume_engine_options(unfinished))
+    else:
+        tasks = parse_tasks(read_lines(args.input))
+    if not tasks:
+        print("エラー: URLを入力してください", file=sys.stderr)
+        return 2
+
+    def on_progress(percent, message):
+        print(f"[{percent:3d}%] {message}", file=sys.stderr, flush=True)
+
+    logger = create_logger(args.log_dir)
+    try:
+        engine = DownloadEngine(tasks, args.output_dir, cookies_file=args.cookies, logger=logger, max_workers=args.workers,
+                                on_progress=None if args.quiet else on_progress,
+                                use_archive=args.archive or bool(args.archive_file), archive_path=args.archive_file,
+                                use_journal=not args.no_journal, max_retries=args.retries, host_rate=args.host_rate,
+                                transcode_workers=args.transcode_workers, check_disk_space=not args.no_disk_check,
+                                **engine_options)
+        results = run_engine(engine)
+        logger.log("=== キャンセル ===" if engine.cancelled else "=== 完了 ===")
+    finally:
+        logger.close()
+
+    for result in results:
+        print(result)
+    if engine.cancelled:
+        return 130
+    return 1 if engine.errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
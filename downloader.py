@@ -0,0 +1,1540 @@
+import os
+import json
+import re
+import copy
+import random
+import shutil
+import sqlite3
+import functools
+import subprocess
+import threading
+import queue
+import time
+from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import urlparse, parse_qs
+
+# yt_dlp は抽出器を含めると読み込みに時間がかかるため、最初に必要になったときに読み込む
+# （GUI では起動後にバックグラウンドで先読みする）
+_yt_dlp = None
+_yt_dlp_lock = threading.Lock()
+
+def load_yt_dlp():
+    global _yt_dlp
+    with _yt_dlp_lock:
+        if _yt_dlp is None:
+            import yt_dlp
+            from yt_dlp.extractor import gen_extractor_classes
+            # 抽出器の一覧もここで組み立てておく
+            gen_extractor_classes()
+            import segmented  # noqa: F401 (分割ダウンロード用の YoutubeDL も合わせて読み込む)
+            _yt_dlp = yt_dlp
+    return _yt_dlp
+
+def youtube_dl_class():
+    load_yt_dlp()
+    import segmented
+    return segmented.SegmentedYoutubeDL
+
+# ログ出力
+# 呼び出し側はキューに積むだけで、書き込み・flush は専用スレッドがまとめて行う。
+# 1行1レコードのJSON形式で、ファイルが大きくなったら新しいファイルに切り替え、
+# logs フォルダ全体が上限を超えたら古いファイルから削除する
+class AsyncLogger:
+    def __init__(self, output_dir="logs", flush_interval=1.0, flush_bytes=64 * 1024,
+                 max_bytes=5 * 1024 * 1024, max_total_bytes=50 * 1024 * 1024):
+        self.output_dir = output_dir
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.max_bytes = max_bytes
+        self.max_total_bytes = max_total_bytes
+        self.queue = queue.SimpleQueue()
+        self.closed = False
+        os.makedirs(output_dir, exist_ok=True)
+        self.file = None
+        self.path = None
+        self.open_new_file()
+        self.thread = threading.Thread(target=self.writer, name="logger", daemon=True)
+        self.thread.start()
+
+    def log(self, message, level="INFO", **fields):
+        record = {"time": datetime.now().isoformat(timespec="milliseconds"), "level": level, "message": message}
+        record.update(fields)
+        self.queue.put(record)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+
+    def open_new_file(self):
+        if self.file:
+            self.file.close()
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(self.output_dir, f"{timestamp}.log")
+        n = 1
+        while os.path.exists(path):
+            path = os.path.join(self.output_dir, f"{timestamp}_{n}.log")
+            n += 1
+        self.path = path
+        self.file = open(path, "w", encoding="utf-8", buffering=self.flush_bytes)
+        self.written = 0
+        self.prune()
+
+    def prune(self):
+        logs = []
+        for name in os.listdir(self.output_dir):
+            path = os.path.join(self.output_dir, name)
+            if name.endswith(".log") and path != self.path:
+                stat = os.stat(path)
+                logs.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in logs)
+        for _, size, path in sorted(logs):
+            if total <= self.max_total_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def writer(self):
+        last_flush = time.monotonic()
+        unflushed = 0
+        while True:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                record = False
+            if record:
+                line = json.dumps(record, ensure_ascii=False) + "\n"
+                if self.written and self.written + len(line) > self.max_bytes:
+                    self.open_new_file()
+                self.file.write(line)
+                self.written += len(line)
+                unflushed += 1
+            # flush_bytes を超えた分はファイルのバッファが書き出すので、ここでは一定間隔ごとにだけ flush する
+            now = time.monotonic()
+            if record is None or (unflushed and now - last_flush >= self.flush_interval):
+                self.file.flush()
+                last_flush = now
+                unflushed = 0
+            if record is None:
+                self.file.close()
+                break
+
+def create_logger(output_dir="logs"):
+    return AsyncLogger(output_dir)
+
+# 同時ダウンロード数の既定値（CPU数を基準に、回線を占有しすぎないよう上限を設ける）
+MAX_WORKERS_LIMIT = 16
+
+def default_worker_count():
+    return max(1, min(4, os.cpu_count() or 1))
+
+# 1ファイルあたりの分割ダウンロード数の上限
+MAX_SEGMENTS = 16
+# タスクごとの状態通知の最短間隔（秒）。状態の変化は間引かない
+TASK_UPDATE_INTERVAL = 0.25
+# 直接変換（ストリーミング）で1リクエストあたりに取得する大きさ（YouTube の http_chunk_size と同じ）
+STREAM_CHUNK_SIZE = 10 * 1024 * 1024
+STREAM_BLOCK_SIZE = 64 * 1024
+
+# 変換（ffmpeg）の同時実行数の既定値
+# 使えるCPU数から、ダウンロードと GUI のために2コアを残し、上限を設ける
+MAX_TRANSCODE_WORKERS = 16
+
+def default_transcode_workers():
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return max(1, min(cpus - 2, MAX_TRANSCODE_WORKERS))
+
+# 音声のみ保存する際、無変換でそのまま使える拡張子と、コンテナだけ差し替える拡張子
+AUDIO_EXTS = ("m4a", "mp3", "opus", "ogg", "aac", "flac", "wav")
+AUDIO_REMUX_EXTS = {"webm": "opus", "mp4": "m4a"}
+
+# 変換プロファイル（名前: (表示名, 拡張子, ffmpeg のエンコード引数)）
+# "-fast" は機種に依存しないエンコーダー側の設定で、音質・サイズより速度を優先したもの
+# "copy" は再エンコードせず、音声ストリームをそのまま音声用のコンテナに移す（拡張子は元の形式で決まる）
+AUDIO_PROFILES = {
+    "mp3": ("MP3 192kbps (CBR)", "mp3", ["-c:a", "libmp3lame", "-b:a", "192k", "-ar", "44100"]),
+    "mp3-vbr": ("MP3 VBR (V2, 約190kbps)", "mp3", ["-c:a", "libmp3lame", "-q:a", "2", "-ar", "44100"]),
+    "mp3-fast": ("MP3 192kbps (CBR, 高速)", "mp3",
+                 ["-c:a", "libmp3lame", "-b:a", "192k", "-ar", "44100", "-compression_level", "9"]),
+    "aac": ("AAC 192kbps", "m4a", ["-c:a", "aac", "-b:a", "192k"]),
+    "opus": ("Opus 128kbps", "opus", ["-c:a", "libopus", "-b:a", "128k"]),
+    "opus-fast": ("Opus 128kbps (高速)", "opus", ["-c:a", "libopus", "-b:a", "128k", "-compression_level", "3"]),
+    "flac": ("FLAC (可逆圧縮)", "flac", ["-c:a", "flac", "-compression_level", "5"]),
+    "flac-fast": ("FLAC (可逆圧縮, 高速)", "flac", ["-c:a", "flac", "-compression_level", "0"]),
+    "copy": ("無変換（音声をそのまま取り出す）", None, ["-c:a", "copy"]),
+}
+
+# 変換後のおおよそのビットレート（kbps）。固定ビットレート以外は多めに見積もる
+def profile_bitrate(profile):
+    args = AUDIO_PROFILES[profile][2]
+    if "-b:a" in args:
+        return int(args[args.index("-b:a") + 1].rstrip("k"))
+    return 1000 if profile.startswith("flac") else 320
+
+def format_bytes(num):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if num < 1024 or unit == "GiB":
+            return f"{num:.1f}{unit}" if unit != "B" else f"{int(num)}{unit}"
+        num /= 1024
+
+def format_eta(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+# ffmpeg を実行し、-progress の出力（key=value 形式）から進捗を読み取る
+# 動画の長さ（秒）が分かれば on_progress(percent, 処理済み秒数, 速度(倍速), 残り秒数) を呼ぶ
+# feed を渡すと、別スレッドで feed(標準入力) を呼んで入力データを流し込む（入力は "pipe:0" で指定する）
+def run_ffmpeg(cmd, duration=None, on_progress=None, feed=None):
+    cmd = [cmd[0], "-hide_banner", "-loglevel", "error", "-nostats", "-progress", "pipe:1"] + cmd[1:]
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE if feed else subprocess.DEVNULL,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               text=True, encoding="utf-8", errors="replace")
+    # エラー出力は -loglevel error で少量だが、パイプが詰まらないよう別スレッドで読む
+    errors = []
+    reader = threading.Thread(target=lambda: errors.extend(process.stderr), daemon=True)
+    reader.start()
+    feed_errors = []
+    writer = None
+    if feed:
+        def write_input():
+            try:
+                feed(process.stdin.buffer)
+            except Exception as e:
+                feed_errors.append(e)
+            finally:
+                # 入力の終わり（途中で失敗した場合も閉じて ffmpeg を終了させる）
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+        writer = threading.Thread(target=write_input, daemon=True)
+        writer.start()
+    position, speed = 0.0, None
+    try:
+        for line in process.stdout:
+            key, _, value = line.strip().partition("=")
+            if key in ("out_time_us", "out_time_ms") and value.isdigit():
+                # out_time_ms も実際の単位はマイクロ秒
+                position = int(value) / 1_000_000
+            elif key == "speed":
+                try:
+                    speed = float(value.rstrip("x"))
+                except ValueError:
+                    speed = None
+            elif key == "progress" and on_progress:
+                percent = min(int(position / duration * 100), 100) if duration else 0
+                if value == "end":
+                    percent = 100
+                eta = max(duration - position, 0) / speed if duration and speed else None
+                on_progress(percent, position, speed, eta)
+    except BaseException:
+        # on_progress から中断された場合（キャンセルなど）は ffmpeg を終了させてから戻る
+        process.terminate()
+        process.wait()
+        reader.join()
+        raise
+    process.wait()
+    reader.join()
+    if writer:
+        writer.join()
+    # 入力側の失敗（通信エラーなど）を優先する。BrokenPipeError は ffmpeg が先に終了した結果
+    if feed_errors and not isinstance(feed_errors[0], BrokenPipeError):
+        raise feed_errors[0]
+    if process.returncode != 0:
+        detail = "".join(errors).strip().splitlines()
+        raise RuntimeError(
+            f"ffmpeg の変換に失敗しました（終了コード {process.returncode}）" + (f": {detail[-1]}" if detail else "")
+        )
+    if feed_errors:
+        raise feed_errors[0]
+
+# 進捗通知の間引き
+# yt-dlp のコールバックは受信チャンクごとに呼ばれるため、GUIへの通知は一定間隔（既定10Hz）にまとめる
+class ProgressThrottle:
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.last = 0.0
+        self.lock = threading.Lock()
+
+    def ready(self, force=False):
+        now = time.monotonic()
+        with self.lock:
+            if force or now - self.last >= self.interval:
+                self.last = now
+                return True
+            return False
+
+# URL から「抽出器名 動画ID」のキーを求める（通信はせず、URL のパターンだけで判定する）
+# yt-dlp の --download-archive と同じ形式。判定できない URL は None
+def video_key(url):
+    found = extractor_key(url)
+    return found[0] if found else None
+
+# キーの判定に使う抽出器の一覧（全体, 動画の抽出器だけ）を一度だけ組み立てる
+# 入力の大半は YouTube の URL のため、YouTube の抽出器を先に並べて照合を早く終える
+# （YouTube の抽出器は YouTube の URL にしか一致しないため、並べ替えても判定は変わらない）
+@functools.lru_cache(maxsize=None)
+def extractor_classes():
+    extractors = [ie for ie in load_yt_dlp().extractor.gen_extractor_classes() if ie.ie_key() != "Generic"]
+    youtube = [ie for ie in extractors if ie.ie_key().startswith("Youtube")]
+    extractors = youtube + [ie for ie in extractors if not ie.ie_key().startswith("Youtube")]
+    return extractors, [ie for ie in extractors if getattr(ie, '_RETURN_TYPE', None) == 'video']
+
+# (キー, 抽出器の種類) を返す。種類は抽出器の _RETURN_TYPE（動画は "video"、プレイリストは "playlist"、
+# どちらもあり得る YoutubeTab などは "any" または None）
+# 数万件のバッチでも同じ URL を照合し直さないよう、結果はすべて残す（1件あたり数百バイト）
+@functools.lru_cache(maxsize=None)
+def extractor_key(url):
+    extractors, video_extractors = extractor_classes()
+    for ie in extractors:
+        if not ie.suitable(url):
+            continue
+        kind = getattr(ie, '_RETURN_TYPE', None)
+        if kind != 'video':
+            # watch?v=...&list=... は最初にプレイリストの抽出器（YoutubeTab）が一致するが、
+            # エンジンは noplaylist で動画1本だけを取得するため、URL に動画 ID があればその動画で識別する
+            # （YoutubeIE.suitable は list 付きの URL を断るため、URL のパターンだけで照合する）
+            for video_ie in video_extractors:
+                if video_ie._match_valid_url(url):
+                    temp_id = video_ie.get_temp_id(url)
+                    if temp_id:
+                        return f"{video_ie.ie_key().lower()} {temp_id}", 'video'
+        temp_id = ie.get_temp_id(url)
+        if temp_id:
+            return f"{ie.ie_key().lower()} {temp_id}", kind
+        return None
+    return None
+
+# ダウンロード済み動画の記録（SQLite）
+# 動画のキーと保存形式ごとに保存先とファイルサイズを残し、次回以降はメタデータ取得の前にスキップする
+class DownloadArchive:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS downloads ("
+                "key TEXT NOT NULL, variant TEXT NOT NULL, url TEXT, files TEXT NOT NULL, recorded_at TEXT, "
+                "PRIMARY KEY (key, variant))"
+            )
+
+    # 記録があり、保存したファイルがすべて同じサイズで残っていればそのパス一覧を返す
+    def lookup(self, key, variant):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT files FROM downloads WHERE key = ? AND variant = ?", (key, variant)
+            ).fetchone()
+        if not row:
+            return None
+        files = json.loads(row[0])
+        for path, size in files:
+            try:
+                if os.path.getsize(path) != size:
+                    return None
+            except OSError:
+                return None
+        return [path for path, _ in files]
+
+    def record(self, key, variant, url, paths):
+        files = [(path, os.path.getsize(path)) for path in paths]
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO downloads (key, variant, url, files, recorded_at) VALUES (?, ?, ?, ?, ?)",
+                (key, variant, url, json.dumps(files, ensure_ascii=False), datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+ARCHIVE_FILENAME = ".download_archive.sqlite3"
+
+# extract_info の結果のキャッシュ
+# 再試行や同じ動画の再指定でページ解析をやり直さないよう、動画ごとに info を保持する。
+# フォーマットURLには有効期限（expire）があるため、TTL とその期限の早い方で破棄し、
+# 件数が上限を超えたら最も古く使われたものから捨てる
+class MetadataCache:
+    def __init__(self, ttl=30 * 60, max_entries=512, expire_margin=5 * 60):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.expire_margin = expire_margin
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, info = entry
+            if time.time() >= expires_at:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        # 呼び出し側で書き換えられても影響しないよう複製を返す
+        return copy.deepcopy(info)
+
+    def put(self, key, info):
+        expires_at = time.time() + self.ttl
+        url_expiry = self.url_expiry(info)
+        if url_expiry:
+            expires_at = min(expires_at, url_expiry - self.expire_margin)
+        with self.lock:
+            self.entries[key] = (expires_at, copy.deepcopy(info))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    # 選択済みフォーマットのURLに含まれる有効期限（UNIX時刻）のうち最も早いもの
+    @staticmethod
+    def url_expiry(info):
+        expiries = []
+        for fmt in info.get('requested_formats') or [info]:
+            url = fmt.get('url') or ""
+            values = parse_qs(urlparse(url).query).get('expire')
+            match = re.search(r"/expire/(\d+)", url)
+            if values and values[0].isdigit():
+                expiries.append(int(values[0]))
+            elif match:
+                expiries.append(int(match.group(1)))
+        return min(expiries) if expiries else None
+
+# ジョブの記録（途中再開用）
+# タスク一覧と各タスクの状態（pending / downloading / converting / done / failed）を
+# 追記のみの JSON Lines で保存し、状態が変わるたびに fsync してクラッシュしても失われないようにする。
+# ダウンロード中の受信バイト数も記録する（こちらは頻度が高いため fsync しない）
+JOURNAL_FILENAME = ".download_job.jsonl"
+
+class JobJournal:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+
+    def start(self, tasks, options):
+        self.file = open(self.path, "w", encoding="utf-8")
+        self.write({"event": "job", "tasks": [list(task) for task in tasks], "options": options}, sync=True)
+        for idx in range(1, len(tasks) + 1):
+            self.update(idx, "pending", sync=False)
+        self.sync()
+
+    # 既存の記録に追記して再開する
+    def reopen(self):
+        # 書きかけの行が残っていれば改行で区切ってから追記する
+        with open(self.path, "rb") as f:
+            partial = False
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                partial = f.read(1) != b"\n"
+        self.file = open(self.path, "a", encoding="utf-8")
+        if partial:
+            self.file.write("\n")
+
+    # 実行中に追加したタスク（プレイリストの展開など）を first_idx 番から記録する
+    def add_tasks(self, first_idx, tasks):
+        self.write({"event": "tasks", "index": first_idx, "tasks": [list(task) for task in tasks]}, sync=False)
+        for idx in range(first_idx, first_idx + len(tasks)):
+            self.update(idx, "pending", sync=False)
+        self.sync()
+
+    def update(self, idx, state, sync=True, **fields):
+        record = {"event": "task", "index": idx, "state": state}
+        record.update(fields)
+        self.write(record, sync)
+
+    def write(self, record, sync):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            if sync:
+                os.fsync(self.file.fileno())
+
+    def sync(self):
+        with self.lock:
+            os.fsync(self.file.fileno())
+
+    def close(self, remove=False):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
+
+    # 記録を読み込み、タスク一覧・オプション・各タスクの最新の状態を返す（記録がなければ None）
+    @staticmethod
+    def load(path):
+        if not os.path.exists(path):
+            return None
+        header = None
+        states = {}
+        added = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # クラッシュ時に書きかけになった行は無視する
+                    continue
+                if record.get("event") == "job":
+                    header = record
+                elif record.get("event") == "task":
+                    states[record["index"]] = record
+                elif record.get("event") == "tasks":
+                    for offset, task in enumerate(record["tasks"]):
+                        added[record["index"] + offset] = task
+        if header is None:
+            return None
+        tasks = header["tasks"]
+        # 追加分は連番で記録しているが、書きかけで欠けた場合はそれ以降を捨てる
+        while len(tasks) + 1 in added:
+            tasks.append(added[len(tasks) + 1])
+        return {
+            "tasks": [tuple(task) for task in tasks],
+            "options": header.get("options", {}),
+            "states": states,
+        }
+
+# 保存先フォルダに中断したジョブがあれば、その記録を返す
+def load_unfinished_job(output_dir):
+    job = JobJournal.load(os.path.join(output_dir, JOURNAL_FILENAME))
+    if job is None:
+        return None
+    # 変換プロファイル導入前の記録（to_mp3）も再開できるようにする
+    options = job["options"]
+    options["aliases"] = {int(idx): names for idx, names in options.get("aliases", {}).items()}
+    if "audio_profile" not in options:
+        options["audio_profile"] = "mp3" if options.pop("to_mp3", False) else None
+    job["pending"] = sum(1 for idx in range(1, len(job["tasks"]) + 1)
+                         if job["states"].get(idx, {}).get("state") != "done")
+    return job if job["pending"] else None
+
+# 記録したオプションのうち、再開時に DownloadEngine へそのまま渡すもの（journal_options の名前と同じ）
+RESUME_OPTIONS = ("audio_profile", "audio_only", "stream_audio", "keep_source", "segments", "aliases")
+
+# 中断したジョブを再開するときの DownloadEngine の引数（記録したオプションと各タスクの状態）
+# 古い記録にないオプションは含めないため、呼び出し元の設定がそのまま使われる
+def resume_engine_options(unfinished):
+    options = unfinished["options"]
+    engine_options = {name: options[name] for name in RESUME_OPTIONS if name in options}
+    engine_options["resume_states"] = unfinished["states"]
+    return engine_options
+
+# 例外と、その原因としてつながっている例外を順に返す
+# yt-dlp の例外は原因となった例外を exc_info / cause に持つため、__cause__ より先にそちらをたどる
+def exception_chain(e):
+    seen = set()
+    while e is not None and id(e) not in seen:
+        seen.add(id(e))
+        yield e
+        exc_info = getattr(e, 'exc_info', None)
+        e = (exc_info[1] if exc_info else None) or getattr(e, 'cause', None) or e.__cause__
+
+# 一時的なエラー（時間をおけば成功する可能性があるもの）かどうかの判定
+TRANSIENT_ERROR_PATTERN = re.compile(
+    r"HTTP Error (403|408|429|5\d\d)|timed out|time-out|Connection (reset|aborted|refused)|"
+    r"Remote end closed|IncompleteRead|Temporary failure in name resolution|getaddrinfo failed|"
+    r"Network is unreachable|\[Errno 104\]|\[WinError 100(53|54|60)\]",
+    re.IGNORECASE,
+)
+
+def is_transient_error(e):
+    exceptions = load_yt_dlp().networking.exceptions
+    for e in exception_chain(e):
+        if isinstance(e, exceptions.HTTPError):
+            return e.status in (403, 408, 429) or e.status >= 500
+        if isinstance(e, exceptions.TransportError):
+            return True
+        if TRANSIENT_ERROR_PATTERN.search(str(e)):
+            return True
+    return False
+
+# フォーマットURLの期限切れを示すエラー（HTTP 403 / 410）かどうかの判定
+EXPIRED_URL_ERROR_PATTERN = re.compile(r"HTTP Error (403|410)")
+
+def is_expired_url_error(e):
+    exceptions = load_yt_dlp().networking.exceptions
+    for e in exception_chain(e):
+        if isinstance(e, exceptions.HTTPError):
+            return e.status in (403, 410)
+        if EXPIRED_URL_ERROR_PATTERN.search(str(e)):
+            return True
+    return False
+
+# ホストごとのリクエスト間隔の制限
+# 同じホストへのリクエスト開始を一定間隔以上あけ、429 を受けたホストはしばらく間隔を広げる
+class HostRateLimiter:
+    def __init__(self, requests_per_second=2.0):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlparse(url).hostname or ""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, 0.0))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def penalize(self, url, delay):
+        host = urlparse(url).hostname or ""
+        with self.lock:
+            self.next_slot[host] = max(self.next_slot.get(host, 0.0), time.monotonic() + delay)
+
+# ダウンロードするファイルの大きさの見積もり（バイト、分からなければ None）
+# filesize → filesize_approx → ビットレート×長さ の順に使い、映像と音声を別々に取得する場合は合計する
+def estimate_download_size(info):
+    total = 0
+    for f in info.get('requested_formats') or [info]:
+        size = f.get('filesize') or f.get('filesize_approx')
+        if not size and f.get('tbr') and info.get('duration'):
+            size = f['tbr'] * 1000 / 8 * info['duration']
+        if not size:
+            return None
+        total += size
+    return int(total)
+
+class DiskSpaceError(OSError):
+    pass
+
+# 保存先の空き容量の予約
+# 同時に実行中のタスクが使う予定の容量を差し引いて、足りない間はダウンロードの開始を待たせる。
+# 予約は完了まで差し引いたままにするため（書き込み済みの分も二重に数える）、見積もりは安全側になる。
+# 現在の空き容量だけで足りない場合は、他のタスクが終わっても空かないためエラーにする
+class DiskSpaceReserver:
+    def __init__(self, path, margin=256 * 1024 * 1024, poll_interval=5.0):
+        self.path = path
+        self.margin = margin
+        self.poll_interval = poll_interval
+        self.reserved = {}
+        self.condition = threading.Condition()
+
+    def free_space(self):
+        return shutil.disk_usage(self.path).free
+
+    # on_wait(必要な容量, 空き容量) は待ち始めるときに1回だけ呼ばれる
+    # check は待っている間に繰り返し呼ばれ、例外を送出すると待つのをやめる（一時停止・キャンセル用）
+    def reserve(self, idx, size, on_wait=None, check=None):
+        waiting = False
+        with self.condition:
+            self.reserved.pop(idx, None)
+            while True:
+                others = sum(self.reserved.values())
+                free = self.free_space()
+                if free - others - self.margin >= size:
+                    self.reserved[idx] = size
+                    return
+                if free - self.margin < size:
+                    raise DiskSpaceError(
+                        f"保存先の空き容量が不足しています（必要: 約{format_bytes(size + self.margin)}、"
+                        f"空き: {format_bytes(free)}）"
+                    )
+                if not waiting and on_wait:
+                    on_wait(size, free - others)
+                waiting = True
+                if check:
+                    check()
+                # 他のタスクの完了か、外部で空き容量が増えるのを待つ
+                self.condition.wait(self.poll_interval)
+
+    def release(self, idx):
+        with self.condition:
+            if self.reserved.pop(idx, None) is not None:
+                self.condition.notify_all()
+
+    # 待っているタスクに状態を確認させる
+    def wake(self):
+        with self.condition:
+            self.condition.notify_all()
+
+# 一時停止・キャンセルによる中断（進捗の通知の中から送出して、ダウンロードや変換を止める）
+class TaskInterrupted(Exception):
+    pass
+
+class TaskPaused(TaskInterrupted):
+    pass
+
+class TaskCancelled(TaskInterrupted):
+    pass
+
+# パイプラインを流れる1件分のタスク
+class DownloadJob:
+    def __init__(self, idx, url, filename, key=None):
+        self.idx = idx
+        self.url = url
+        self.filename = filename
+        self.key = key
+        self.attempts = 0
+        self.info = None
+        self.media_file = None
+        self.queued_at = None
+        # 最後にログへ書いた状態（状態, 10%刻みの区切り）
+        self.log_state = None
+
+# ダウンロードと変換の処理本体（GUI・CLI 共通、PyQt6 に依存しない）
+# メタデータ取得 → ダウンロード → 変換 の3段をサイズ制限付きキューでつなぎ、
+# 変換中に次の動画のダウンロードと、その次の動画の解析を並行して進める
+class DownloadEngine:
+    def __init__(self, tasks, output_dir, audio_profile=None, cookies_file=None, logger=None, max_workers=None, audio_only=False,
+                 on_progress=None, on_task_update=None, use_archive=False, archive_path=None, metadata_cache=None,
+                 use_journal=True, resume_states=None, max_retries=3, retry_base_delay=2.0, retry_max_delay=60.0,
+                 host_rate=2.0, segments=1, transcode_workers=None, stream_audio=False, keep_source=False,
+                 check_disk_space=True, aliases=None):
+        # プレイリストの展開でタスクが増えるため、呼び出し元の一覧とは別に持つ
+        self.tasks = list(tasks)
+        self.output_dir = output_dir
+        if audio_profile is not None and audio_profile not in AUDIO_PROFILES:
+            raise ValueError(f"不明な変換プロファイルです: {audio_profile}")
+        self.audio_profile = audio_profile
+        self.audio_only = audio_only
+        self.cookies_file = cookies_file
+        self.cookie_jar = None
+        self.logger = logger
+        self.max_workers = max(1, min(max_workers or default_worker_count(), MAX_WORKERS_LIMIT))
+        self.on_progress = on_progress
+        # タスクごとの状態の通知: on_task_update(タスク番号, {項目: 値})
+        self.on_task_update = on_task_update
+        self.task_updated_at = {}
+        self.use_archive = use_archive
+        self.archive_path = archive_path or os.path.join(output_dir, ARCHIVE_FILENAME)
+        self.archive = None
+        self.metadata_cache = metadata_cache if metadata_cache is not None else MetadataCache()
+        self.use_journal = use_journal
+        self.resume_states = resume_states or {}
+        # 重複をまとめたタスクの、2つ目以降の出力名（タスク番号: [出力名, ...]）
+        self.aliases = aliases or {}
+        self.journal = None
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.rate_limiter = HostRateLimiter(host_rate)
+        self.segments = max(1, min(segments, MAX_SEGMENTS))
+        self.transcode_workers = max(1, min(transcode_workers or default_transcode_workers(), MAX_TRANSCODE_WORKERS))
+        # 音声のみの変換で、ダウンロード中のデータをそのまま ffmpeg に流す（中間ファイルを作らない）
+        self.stream_audio = stream_audio
+        self.keep_source = keep_source
+        self.check_disk_space = check_disk_space
+        self.disk_space = None
+        # 一時停止・キャンセル（バッチ全体、またはタスク番号ごと）
+        self.paused = False
+        self.cancelled = False
+        self.paused_tasks = set()
+        self.cancelled_tasks = set()
+        # 一時停止で止めたタスク（再開時に解析段へ戻す）と、再試行待ちのタイマー
+        self.parked = {}
+        self.retry_timers = {}
+        self.transcode_stats = {}
+        self.task_progress = {}
+        self.results = {}
+        self.errors = set()
+        self.cancelled_jobs = set()
+        self.lock = threading.Lock()
+        self.throttle = ProgressThrottle()
+
+    def log(self, message, level="INFO", **fields):
+        if self.logger:
+            self.logger.log(message, level, **fields)
+
+    # タスクごとの進捗を保持し、全体の進捗（平均）として通知する
+    # 状態が変わったとき（force=True）以外は一定間隔に間引く
+    # state などの項目を渡すと、タスクごとの状態としても通知する
+    def report(self, idx, percent, msg, force=True, **fields):
+        with self.lock:
+            # タスク数が多くても通知のたびに合計し直さないよう、差分だけ反映する
+            self.progress_sum += percent - self.task_progress.get(idx, 0)
+            self.task_progress[idx] = percent
+            total = self.progress_sum // len(self.task_progress)
+        if self.on_progress and self.throttle.ready(force):
+            self.on_progress(total, msg)
+        if fields:
+            self.task_update(idx, force, percent=percent, **fields)
+
+    # タスクごとの状態の通知（状態が変わらない進捗の更新はタスクごとに一定間隔に間引く）
+    def task_update(self, idx, force=True, **fields):
+        if not self.on_task_update:
+            return
+        now = time.monotonic()
+        with self.lock:
+            if not force and now - self.task_updated_at.get(idx, 0.0) < TASK_UPDATE_INTERVAL:
+                return
+            self.task_updated_at[idx] = now
+        self.on_task_update(idx, fields)
+
+    def run(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        keys = None
+        if not self.resume_states:
+            # 同じ動画を指す URL（youtu.be / watch?v=...&t=30 / shorts など）を1つのタスクにまとめる
+            # まとめるときに求めたキーはそのままタスクに持たせ、登録時に判定し直さない
+            count = len(self.tasks)
+            self.tasks, self.aliases, keys = dedupe_tasks(self.tasks)
+            if len(self.tasks) < count:
+                self.log(f"Merged {count - len(self.tasks)} duplicate URLs", tasks=len(self.tasks))
+        self.errors = set()
+        self.task_progress = {idx: 0 for idx in range(1, len(self.tasks) + 1)}
+        self.progress_sum = 0
+        self.task_updated_at = {}
+        # 登録済みの動画のキー（重なり合うプレイリストから同じ動画を二重に追加しない）
+        self.seen_keys = set()
+        self.results = {}
+        self.cancelled_jobs = set()
+        self.transcode_stats = {'jobs': 0, 'busy_seconds': 0.0, 'wait_seconds': 0.0, 'max_queue_depth': 0, 'streamed': 0}
+        self.remaining = len(self.tasks)
+        self.all_done = threading.Event()
+        if not self.tasks:
+            self.all_done.set()
+        self.cookie_jar = self.load_cookies()
+        if self.use_archive:
+            self.archive = DownloadArchive(self.archive_path)
+        if self.check_disk_space:
+            self.disk_space = DiskSpaceReserver(self.output_dir)
+            self.log(f"Free space in {self.output_dir}: {format_bytes(self.disk_space.free_space())}")
+        if self.use_journal:
+            self.journal = JobJournal(os.path.join(self.output_dir, JOURNAL_FILENAME))
+            if self.resume_states:
+                self.journal.reopen()
+            else:
+                self.journal.start(self.tasks, self.journal_options())
+
+        # 解析結果はフォーマットURLの期限があるため、ダウンロード側より先行しすぎないよう制限する
+        self.resolve_queue = queue.Queue()
+        self.fetch_queue = queue.Queue(maxsize=self.max_workers)
+        # 変換はCPU数に合わせた複数の ffmpeg で並行して行う
+        self.convert_queue = queue.Queue(maxsize=max(self.max_workers, self.transcode_workers))
+        stages = [
+            (self.resolve_queue, self.resolve, self.max_workers, True),
+            (self.fetch_queue, self.fetch, self.max_workers, True),
+            (self.convert_queue, self.convert, self.transcode_workers, False),
+        ]
+        # 入力のタスクはワーカーの開始前に確定しておく
+        # （self.tasks にはプレイリストの展開でワーカーからタスクが追加されるため、そのまま回すと二重に登録してしまう）
+        # 動画のキーも先に登録し、展開したプレイリストの中に後ろの入力と同じ動画があれば除けるようにする
+        initial = [DownloadJob(idx, url, filename, keys[idx - 1] if keys else None)
+                   for idx, (url, filename) in enumerate(self.tasks, 1)]
+        for job in initial:
+            self.seen_keys.add(self.task_key(job))
+
+        workers = []
+        for in_queue, handler, count, use_ydl in stages:
+            for _ in range(count):
+                worker = threading.Thread(target=self.stage_worker, args=(in_queue, handler, use_ydl), daemon=True)
+                worker.start()
+                workers.append(worker)
+
+        for job in initial:
+            idx = job.idx
+            self.task_update(idx, state="pending", url=job.url, name=job.filename)
+            state = self.resume_states.get(idx, {})
+            if state.get("state") == "done":
+                # 前回完了済みのタスクは結果だけ引き継ぐ（タスクごとに記録へ追記・fsync しない）
+                self.progress_sum += 100
+                self.task_progress[idx] = 100
+                self.finish(job, state.get("result", ""), record=False)
+                continue
+            self.resolve_queue.put(job)
+
+        self.all_done.wait()
+        for in_queue, _, count, _ in stages:
+            for _ in range(count):
+                in_queue.put(None)
+        for worker in workers:
+            worker.join()
+        if self.cookie_jar is not None:
+            # 実行中にサーバーから更新された cookie を、全ワーカーの終了後に1回だけ書き戻す
+            try:
+                self.cookie_jar.save()
+            except OSError as e:
+                self.log(f"Failed to save cookies: {e}", "WARNING")
+            self.cookie_jar = None
+        if self.archive:
+            self.archive.close()
+            self.archive = None
+        if self.journal:
+            # 失敗・キャンセルしたタスクがあれば、次回再開できるよう記録を残す
+            self.journal.close(remove=not self.errors and not self.cancelled_jobs)
+            self.journal = None
+        if self.transcode_stats['jobs'] or self.transcode_stats['streamed']:
+            self.log("Transcode stats", workers=self.transcode_workers, **self.transcode_stats)
+
+        # 結果は入力順に並べる
+        return [self.results[idx] for idx in sorted(self.results)]
+
+    # cookies.txt はバッチごとに1回だけ読み込み、全ワーカーの YoutubeDL で同じ cookie jar を使う
+    # （各 YoutubeDL に cookiefile を渡すと、読み込みが close() まで遅れる上に、close() のたびに
+    #  同じファイルを書き直すため、同時に終了したワーカー同士で読み書きが重なってファイルが壊れる）
+    def load_cookies(self):
+        if not self.cookies_file or not os.path.exists(self.cookies_file):
+            return None
+        jar = load_yt_dlp().cookies.YoutubeDLCookieJar(self.cookies_file)
+        try:
+            jar.load()
+        except OSError as e:
+            self.log(f"Failed to load cookies from {self.cookies_file}: {e}", "ERROR")
+            return None
+        return jar
+
+    # YoutubeDL はスレッドセーフではないため、ワーカーごとに1つだけ作って使い回す
+    # （抽出器の初期化・cookies.txt の読み込み・HTTP接続をバッチ全体で共有する）
+    def stage_worker(self, in_queue, handler, use_ydl):
+        current = {}
+        ydl = None
+        if use_ydl:
+            ydl = youtube_dl_class()(self.ydl_options(lambda d: self.progress_hook(current.get('job'), d)))
+            ydl.segments = self.segments
+            if self.cookie_jar is not None:
+                ydl.cookiejar = self.cookie_jar
+        try:
+            while True:
+                job = in_queue.get()
+                if job is None:
+                    break
+                current['job'] = job
+                try:
+                    self.check_control(job)
+                    handler(job, ydl)
+                except Exception as e:
+                    # yt-dlp が例外を包み直すことがあるため、中断は例外の型ではなく状態で判定する
+                    if self.is_cancelled(job):
+                        self.cancel_job(job)
+                    elif self.is_paused(job):
+                        self.park(job)
+                    elif not self.schedule_retry(job, e):
+                        self.finish(job, self.format_error(job.url, e), failed=True)
+                finally:
+                    current.pop('job', None)
+        finally:
+            if ydl:
+                ydl.close()
+
+    # 一時的なエラーなら、指数バックオフ（ジッター付き）の後に解析段へ戻す
+    def schedule_retry(self, job, e):
+        if job.attempts >= self.max_retries or not is_transient_error(e):
+            return False
+        job.attempts += 1
+        delay = min(self.retry_base_delay * 2 ** (job.attempts - 1), self.retry_max_delay)
+        delay += random.uniform(0, delay / 2)
+        if "429" in str(e):
+            # 制限を受けたホストへのリクエストをしばらく控える
+            self.rate_limiter.penalize(job.url, delay)
+        msg = f"Retrying {job.filename or job.url} in {delay:.1f}s ({job.attempts}/{self.max_retries}): {e}"
+        self.report(job.idx, 0, msg, state="retrying", error=str(e), eta=delay)
+        self.log(msg, "WARNING", task=job.idx, url=job.url)
+        self.update_journal(job, "pending", attempts=job.attempts, error=str(e))
+        if self.disk_space:
+            self.disk_space.release(job.idx)
+        job.info = None
+        job.log_state = None
+        timer = threading.Timer(delay, self.retry_now, args=(job,))
+        timer.daemon = True
+        with self.lock:
+            self.retry_timers[job.idx] = (timer, job)
+        timer.start()
+        return True
+
+    def retry_now(self, job):
+        with self.lock:
+            # キャンセルで取り消された場合は何もしない
+            if self.retry_timers.pop(job.idx, None) is None:
+                return
+        self.resolve_queue.put(job)
+
+    # 一時停止・キャンセルの状態
+    def is_cancelled(self, job):
+        return self.cancelled or job.idx in self.cancelled_tasks
+
+    def is_paused(self, job):
+        return self.paused or job.idx in self.paused_tasks
+
+    # 各段の開始時とダウンロードの進捗ごとに呼び、一時停止・キャンセルなら例外で処理を中断する
+    # 中断したダウンロードの .part（分割ダウンロードの .segments）は残り、再開時にその続きから取得する
+    def check_control(self, job):
+        if self.is_cancelled(job):
+            raise TaskCancelled("キャンセルしました")
+        if self.is_paused(job):
+            raise TaskPaused("一時停止しました")
+
+    # 一時停止: idx を省略するとバッチ全体（実行中のダウンロードも止めて、帯域を空ける）
+    # 変換中のタスクは CPU のみを使うため、その変換が終わるまで続ける
+    def pause(self, idx=None):
+        with self.lock:
+            if idx is None:
+                self.paused = True
+            else:
+                self.paused_tasks.add(idx)
+        self.log("Paused" if idx is None else f"Paused task {idx}", task=idx)
+
+    def resume(self, idx=None):
+        with self.lock:
+            if idx is None:
+                self.paused = False
+            else:
+                self.paused_tasks.discard(idx)
+            ready = [job for i, job in self.parked.items() if not self.paused and i not in self.paused_tasks]
+            for job in ready:
+                del self.parked[job.idx]
+        self.log("Resumed" if idx is None else f"Resumed task {idx}", task=idx)
+        if self.disk_space:
+            self.disk_space.wake()
+        for job in ready:
+            self.report(job.idx, 0, f"Resumed {job.filename or job.url}", state="pending")
+            self.resolve_queue.put(job)
+
+    # キャンセル: idx を省略するとバッチ全体。止めたタスク・再試行待ちのタスクはその場で終了にする
+    def cancel(self, idx=None):
+        with self.lock:
+            if idx is None:
+                self.cancelled = True
+            else:
+                self.cancelled_tasks.add(idx)
+            jobs = [job for i, job in self.parked.items() if idx is None or i == idx]
+            for job in jobs:
+                del self.parked[job.idx]
+            for i in [i for i in self.retry_timers if idx is None or i == idx]:
+                timer, job = self.retry_timers.pop(i)
+                timer.cancel()
+                jobs.append(job)
+        self.log("Cancelled" if idx is None else f"Cancelled task {idx}", "WARNING", task=idx)
+        if self.disk_space:
+            self.disk_space.wake()
+        for job in jobs:
+            self.cancel_job(job)
+
+    # 一時停止中のタスクを預かる（解析からやり直すため、ダウンロード中だった場合も .part の続きから取得する）
+    def park(self, job):
+        job.log_state = None
+        if self.disk_space:
+            self.disk_space.release(job.idx)
+        self.update_journal(job, "pending")
+        self.report(job.idx, self.task_progress.get(job.idx, 0), f"Paused {job.filename or job.url}",
+                    state="paused", speed=None, eta=None)
+        with self.lock:
+            # 止めている間に再開された場合はすぐに戻す
+            if self.is_paused(job):
+                self.parked[job.idx] = job
+                return
+        self.resolve_queue.put(job)
+
+    def cancel_job(self, job):
+        msg = f"Cancelled {job.filename or job.url}"
+        self.report(job.idx, self.task_progress.get(job.idx, 0), msg)
+        self.log(msg, "WARNING", task=job.idx)
+        self.finish(job, f"URL: {job.url} はキャンセルしました", cancelled=True)
+
+    # 保存形式（同じ動画でも形式が違えば別物として記録する）
+    def output_variant(self):
+        if self.audio_only:
+            return f"audio+{self.audio_profile}" if self.audio_profile else "audio"
+        return f"video+{self.audio_profile}" if self.audio_profile else "video"
+
+    # 正常に完了したタスク
+    def complete(self, job, outputs):
+        if job.idx in self.aliases:
+            outputs = outputs + self.link_aliases(job, outputs)
+        if self.archive:
+            try:
+                self.archive.record(self.task_key(job), self.output_variant(), job.url, outputs)
+            except OSError as e:
+                self.log(f"Failed to record archive entry: {e}", "WARNING", task=job.idx)
+        self.finish(job, "\n".join(outputs))
+
+    # 重複していたタスクの別の出力名でも同じファイルを保存する（ハードリンク、できなければコピー）
+    def link_aliases(self, job, outputs):
+        links = []
+        for alias in self.aliases[job.idx]:
+            for path in outputs:
+                ext = os.path.splitext(path)[1]
+                target = os.path.join(os.path.dirname(path), alias + ext)
+                if os.path.abspath(target) == os.path.abspath(path):
+                    continue
+                try:
+                    if os.path.exists(target):
+                        os.remove(target)
+                    try:
+                        os.link(path, target)
+                    except OSError:
+                        shutil.copy2(path, target)
+                    links.append(target)
+                except OSError as e:
+                    self.log(f"Failed to save {target}: {e}", "WARNING", task=job.idx)
+        return links
+
+    # 再開時に同じ条件で実行するため、ジョブの記録に残すオプション
+    def journal_options(self):
+        return {"audio_profile": self.audio_profile, "audio_only": self.audio_only,
+                "stream_audio": self.stream_audio, "keep_source": self.keep_source, "segments": self.segments,
+                "aliases": {str(idx): names for idx, names in self.aliases.items()}}
+
+    def update_journal(self, job, state, sync=True, **fields):
+        if self.journal:
+            self.journal.update(job.idx, state, sync, **fields)
+
+    # record=False は前回の記録から引き継いだ完了（記録に残っているため書き直さない）
+    def finish(self, job, result, failed=False, cancelled=False, record=True):
+        if record:
+            self.update_journal(job, "failed" if failed else "cancelled" if cancelled else "done", result=result)
+        if failed:
+            self.task_update(job.idx, state="failed", error=result, speed=None, ratio=None, eta=None)
+        elif cancelled:
+            self.task_update(job.idx, state="cancelled", error=result, speed=None, ratio=None, eta=None)
+        else:
+            self.task_update(job.idx, state="done", percent=100, output=result, speed=None, ratio=None, eta=None)
+        if self.disk_space:
+            self.disk_space.release(job.idx)
+        with self.lock:
+            if failed:
+                self.errors.add(job.idx)
+            if cancelled:
+                self.cancelled_jobs.add(job.idx)
+            self.results[job.idx] = result
+            self.remaining -= 1
+            if self.remaining == 0:
+                self.all_done.set()
+
+    def format_error(self, url, e):
+        err_msg = str(e)
+        if "The following content is not available on this app" in err_msg:
+            err_msg += (
+                "\n\nこの動画はYouTubeのアプリ限定コンテンツです。\n"
+                "cookies.txt を使用してログイン状態を反映するとダウンロード可能になる場合があります。"
+            )
+        if isinstance(e, DiskSpaceError) or "No space left on device" in err_msg or "[Errno 28]" in err_msg:
+            err_msg += "\n\n保存先の空き容量を増やすか、別の保存先を指定してください。"
+        self.log(f"URL {url} - {err_msg}", "ERROR", url=url)
+        return f"URL: {url} でエラー発生: {err_msg}"
+
+    def output_template(self, job):
+        if job.filename:
+            return os.path.join(self.output_dir, f"{job.filename}.%(ext)s")
+        return os.path.join(self.output_dir, "%(title)s.%(ext)s")
+
+    def ydl_options(self, progress_hook):
+        ydl_opts = {
+            'format': 'bestvideo+bestaudio/best',
+            'outtmpl': os.path.join(self.output_dir, "%(title)s.%(ext)s"),
+            'merge_output_format': 'mp4',
+            'noplaylist': True,
+            'quiet': True,
+            # 進捗は progress_hook で扱うため、yt-dlp 自身の進捗表示は出さない
+            'noprogress': True,
+            'progress_hooks': [progress_hook],
+            # プレイリスト・チャンネルは各動画の URL だけを取得し、動画ごとのタスクに展開する
+            # （watch?v=...&list=... のような URL は noplaylist により動画1本として扱う）
+            'extract_flat': 'in_playlist',
+            # DASH/HLS の断片を同時に取得する数（通常の HTTP は SegmentedYoutubeDL が範囲分割する）
+            'concurrent_fragment_downloads': self.segments,
+        }
+        if self.audio_only:
+            # 音声のみの場合は映像を取得せず、結合も行わない
+            ydl_opts['format'] = 'bestaudio/best'
+            del ydl_opts['merge_output_format']
+        # cookies.txt は cookiefile として渡さず、run() で読み込んだものを stage_worker で共有する
+        return ydl_opts
+
+    # 記録・キャッシュ用のキー（抽出器で判定できない URL は URL そのもの）
+    def task_key(self, job):
+        if job.key is None:
+            job.key = video_key(job.url) or job.url
+        return job.key
+
+    # 1段目: メタデータ取得
+    def resolve(self, job, ydl):
+        msg = f"Resolving {job.filename or job.url} ({job.idx}/{len(self.tasks)})"
+        self.report(job.idx, 0, msg, state="resolving")
+        self.log(msg, task=job.idx)
+        if self.archive:
+            outputs = self.archive.lookup(self.task_key(job), self.output_variant())
+            if outputs:
+                msg = f"Already downloaded: {job.key} ({job.idx}/{len(self.tasks)})"
+                self.report(job.idx, 100, msg, state="skipped")
+                self.log(msg, task=job.idx)
+                self.finish(job, "\n".join(outputs) + "\n（ダウンロード済みのためスキップ）")
+                return
+        job.info = self.metadata_cache.get(self.task_key(job))
+        if job.info is not None:
+            self.log(f"Using cached metadata: {job.url}", task=job.idx)
+        else:
+            self.rate_limiter.wait(job.url)
+            job.info = ydl.extract_info(job.url, download=False)
+            if job.info.get('_type') in ('playlist', 'multi_video'):
+                self.expand_playlist(job, job.info)
+                return
+            self.metadata_cache.put(self.task_key(job), job.info)
+        self.fetch_queue.put(job)
+
+    # プレイリスト・チャンネルの各動画を新しいタスクとして解析段に追加する
+    # 出力名の指定があれば「出力名_001」のように番号を付ける（番号はプレイリスト内の位置）
+    def expand_playlist(self, job, info):
+        entries = [entry for entry in info.get('entries') or [] if entry]
+        width = max(3, len(str(len(entries))))
+        new_tasks, skipped = [], 0
+        with self.lock:
+            for position, entry in enumerate(entries, 1):
+                url = entry.get('url') or entry.get('webpage_url')
+                if not url:
+                    continue
+                # 平坦な抽出結果は抽出器名と ID を持つため、URL を照合せずにキーを作れる
+                key = (f"{entry['ie_key'].lower()} {entry['id']}" if entry.get('ie_key') and entry.get('id')
+                       and entry.get('_type', 'url') == 'url' else video_key(url) or url)
+                if key in self.seen_keys:
+                    skipped += 1
+                    continue
+                self.seen_keys.add(key)
+                filename = f"{job.filename}_{position:0{width}d}" if job.filename else None
+                new_tasks.append((url, filename, key))
+            first_idx = len(self.tasks) + 1
+            for offset, (url, filename, _) in enumerate(new_tasks):
+                self.tasks.append((url, filename))
+                self.task_progress[first_idx + offset] = 0
+            # 元のタスクを完了にする前に増やしておく（全体の完了判定が先に成立しないように）
+            self.remaining += len(new_tasks)
+        if self.journal and new_tasks:
+            self.journal.add_tasks(first_idx, [(url, filename) for url, filename, _ in new_tasks])
+
+        title = info.get('title') or job.url
+        msg = f"Expanded playlist {title}: {len(new_tasks)} new, {skipped} duplicate ({job.idx}/{len(self.tasks)})"
+        self.report(job.idx, 100, msg)
+        self.log(msg, task=job.idx, entries=len(entries))
+        for offset, (url, filename, key) in enumerate(new_tasks):
+            self.task_update(first_idx + offset, state="pending", url=url, name=filename)
+            child = DownloadJob(first_idx + offset, url, filename)
+            child.key = key
+            self.resolve_queue.put(child)
+        self.finish(job, f"プレイリスト: {title}（{len(new_tasks)} 件を追加" +
+                    (f"、重複 {skipped} 件を除外）" if skipped else "）"))
+
+    def progress_hook(self, job, d):
+        if job is None:
+            return
+        idx, filename = job.idx, job.filename
+        if d['status'] == 'downloading':
+            self.check_control(job)
+            downloaded = d.get('downloaded_bytes') or 0
+            total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+            percent = min(int(downloaded / total * 100), 100) if total else 0
+            details = [format_bytes(downloaded) + (f"/{format_bytes(total)}" if total else "")]
+            if d.get('speed'):
+                details.append(f"{format_bytes(d['speed'])}/s")
+            if d.get('eta') is not None:
+                details.append(f"ETA {format_eta(d['eta'])}")
+            msg = f"Downloading {filename or 'video'} ({idx}/{len(self.tasks)}) {' '.join(details)}"
+            self.report(idx, percent, msg, force=False, state="downloading", downloaded=downloaded,
+                        total=total or None, speed=d.get('speed'), eta=d.get('eta'))
+            # ログ（とジョブの記録）は状態の変化と10%刻みの区切りを越えたときだけ書く
+            state = ('downloading', percent // 10)
+            if job.log_state != state:
+                job.log_state = state
+                self.log(msg, task=idx)
+                self.update_journal(job, "downloading", sync=False, bytes=downloaded, file=d.get('tmpfilename'))
+        elif d['status'] == 'finished':
+            msg = f"Download finished: {filename or 'video'} ({idx}/{len(self.tasks)})"
+            job.log_state = ('finished', 10)
+            # 進捗の通知は間引いているため、最後に通知したバイト数のままにならないよう完了時のサイズで上書きする
+            size = d.get('total_bytes') or d.get('downloaded_bytes')
+            sizes = {'downloaded': size, 'total': size} if size else {}
+            self.report(idx, 100, msg, state="downloaded", speed=None, eta=None, **sizes)
+            self.log(msg, task=idx)
+
+    # 2段目: ダウンロード（と結合）
+    def fetch(self, job, ydl):
+        filename = job.filename
+        # 使い回しているインスタンスなので、出力先テンプレートだけタスクごとに差し替える
+        ydl.params['outtmpl']['default'] = self.output_template(job)
+        if self.disk_space:
+            self.reserve_disk_space(job)
+        if self.stream_audio and self.audio_only:
+            try:
+                if self.stream_convert(job, ydl):
+                    return
+            except RuntimeError as e:
+                # パイプからは読めない形式（moov が末尾にある MP4 など）は、ファイルに保存してから変換する
+                self.log(f"Streaming conversion failed, falling back to file: {e}", "WARNING", task=job.idx)
+                job.log_state = None
+        # 中断後の再開時は、yt-dlp が .part ファイルの続きから Range 指定で取得する
+        self.update_journal(job, "downloading")
+        formats = job.info.get('requested_formats') or [job.info]
+        self.rate_limiter.wait(formats[0].get('url') or job.url)
+        try:
+            info = ydl.process_ie_result(job.info, download=True)
+        except Exception as e:
+            self.invalidate_metadata(job, e)
+            raise
+        title = filename or info.get('title', 'output')
+        downloads = info.get('requested_downloads') or [{}]
+        job.media_file = downloads[0].get('filepath') or os.path.join(self.output_dir, f"{title}.mp4")
+        job.info = info
+
+        if self.conversion_command(job):
+            self.update_journal(job, "converting", file=job.media_file)
+            job.queued_at = time.monotonic()
+            self.convert_queue.put(job)
+            with self.lock:
+                depth = self.convert_queue.qsize()
+                self.transcode_stats['max_queue_depth'] = max(self.transcode_stats['max_queue_depth'], depth)
+            self.log(f"Queued for conversion: {job.media_file} (queue depth {depth})", task=job.idx)
+        else:
+            self.complete(job, [job.media_file])
+
+    # フォーマットURLの期限切れ（HTTP 403 / 410、または expire を過ぎた）で失敗したときだけキャッシュを捨て、次回は解析からやり直す
+    # 通信の切断や一時停止・キャンセルでは残し、再試行・再開時はページ解析を省く
+    def invalidate_metadata(self, job, e):
+        expiry = MetadataCache.url_expiry(job.info or {})
+        if is_expired_url_error(e) or (expiry and expiry <= time.time()):
+            self.metadata_cache.invalidate(self.task_key(job))
+
+    # 保存に必要な容量の見積もり（一時的に同時に存在するファイルも含めた最大値）
+    # 大きさが分からない場合は 0 とし、最低限の空き（margin）だけ確認する
+    def estimate_size(self, job):
+        download = estimate_download_size(job.info) or 0
+        size = download
+        if len(job.info.get('requested_formats') or []) > 1:
+            # 映像と音声の結合中は、結合前のファイルと結合後のファイルが両方ある
+            size += download
+        profile = self.audio_profile or ("copy" if self.audio_only else None)
+        if profile:
+            duration = job.info.get('duration')
+            size += int(duration * profile_bitrate(profile) * 1000 / 8) if duration else download
+        return size
+
+    def reserve_disk_space(self, job):
+        size = self.estimate_size(job)
+
+        def on_wait(needed, available):
+            msg = (f"Waiting for disk space: {job.filename or job.url} needs {format_bytes(needed)}, "
+                   f"{format_bytes(max(available, 0))} available ({job.idx}/{len(self.tasks)})")
+            self.report(job.idx, 0, msg, state="waiting")
+            self.log(msg, "WARNING", task=job.idx)
+
+        self.disk_space.reserve(job.idx, size, on_wait, check=lambda: self.check_control(job))
+        self.log(f"Reserved {format_bytes(size)} for {job.filename or job.url}", task=job.idx)
+
+    # 直接変換（音声のみ）: ダウンロードしたデータをファイルに保存せず ffmpeg の標準入力へ流す
+    # 範囲指定で少しずつ取得し、途中で切れた場合はその位置から取得し直す。
+    # 断片に分かれた形式（DASH/HLS）や変換が不要な場合は False を返し、通常のダウンロードに任せる
+    def stream_convert(self, job, ydl):
+        info = job.info
+        if (info.get('requested_formats') or info.get('fragments') or info.get('is_live')
+                or info.get('protocol') not in ('http', 'https') or not info.get('url')):
+            return False
+        # prepare_filename は保存先が相対パスならそのまま返すため、ファイルに保存する場合と同じく絶対パスにする
+        # （結果やダウンロード済みの記録が作業ディレクトリに依存しないように）
+        job.media_file = os.path.abspath(ydl.prepare_filename(info))
+        cmd = self.conversion_command(job, source="pipe:0")
+        if cmd is None:
+            return False
+        # パイプからは読めない箇所があっても ffmpeg は正常終了するため、エラーで止める
+        cmd.insert(1, "-xerror")
+        out_file = cmd[-1]
+        source_file = job.media_file if self.keep_source else None
+        url, headers = info['url'], dict(info.get('http_headers') or {})
+        total = info.get('filesize') or None
+        chunk_size = (info.get('downloader_options') or {}).get('http_chunk_size') or STREAM_CHUNK_SIZE
+        request_class = load_yt_dlp().networking.Request
+        title = job.filename or info.get('title', 'output')
+        label = AUDIO_PROFILES[self.audio_profile or "copy"][0]
+        self.update_journal(job, "downloading")
+        self.log(f"Streaming {title} to {label}", task=job.idx, url=url)
+        started = time.monotonic()
+
+        def feed(stdin):
+            nonlocal total
+            position = 0
+            failures = 0
+            source = open(source_file + ".part", "wb") if source_file else None
+            try:
+                while total is None or position < total:
+                    end = position + chunk_size - 1
+                    if total:
+                        end = min(end, total - 1)
+                    self.rate_limiter.wait(url)
+                    try:
+                        with ydl.urlopen(request_class(url, headers={**headers, 'Range': f"bytes={position}-{end}"})) as response:
+                            ranged = response.status == 206
+                            if ranged:
+                                content_range = response.headers.get('Content-Range') or ""
+                                size = content_range.rsplit("/", 1)[-1]
+                                if size.isdigit():
+                                    total = int(size)
+                            elif position:
+                                raise RuntimeError("サーバーが範囲指定に対応していないため、途中から取得できません")
+                            while True:
+                                block = response.read(STREAM_BLOCK_SIZE)
+                                if not block:
+                                    break
+                                stdin.write(block)
+                                if source:
+                                    source.write(block)
+                                position += len(block)
+                                elapsed = time.monotonic() - started
+                                speed = position / elapsed if elapsed > 0 else None
+                                self.progress_hook(job, {
+                                    'status': 'downloading', 'downloaded_bytes': position, 'total_bytes': total,
+                                    'speed': speed, 'eta': (total - position) / speed if total and speed else None,
+                                })
+                        failures = 0
+                    except (RuntimeError, BrokenPipeError, TaskInterrupted):
+                        raise
+                    except Exception:
+                        # 通信が途中で切れた場合は、受信済みの位置から取得し直す
+                        failures += 1
+                        if failures > self.max_retries:
+                            raise
+                        time.sleep(min(self.retry_base_delay * 2 ** (failures - 1), self.retry_max_delay))
+                        continue
+                    if not ranged or (total is None and position <= end):
+                        # 範囲指定に対応していない（全体を一度に受信した）か、最後の範囲まで受信した
+                        total = position
+            finally:
+                if source:
+                    source.close()
+
+        try:
+            run_ffmpeg(cmd, feed=feed)
+        except Exception as e:
+            for path in (out_file, source_file and source_file + ".part"):
+                if path and os.path.exists(path):
+                    os.remove(path)
+            self.invalidate_metadata(job, e)
+            raise
+        elapsed = time.monotonic() - started
+        self.progress_hook(job, {'status': 'finished', 'downloaded_bytes': total, 'total_bytes': total})
+        with self.lock:
+            self.transcode_stats['streamed'] += 1
+        msg = f"Conversion finished: {title} ({elapsed:.1f}s)"
+        self.report(job.idx, 100, msg)
+        self.log(msg, task=job.idx, seconds=round(elapsed, 2), streamed=True)
+        outputs = [out_file]
+        if source_file:
+            os.replace(source_file + ".part", source_file)
+            outputs.insert(0, source_file)
+        self.complete(job, outputs)
+        return True
+
+    # 変換が不要な場合は None を返す（source で ffmpeg への入力を差し替えられる）
+    def conversion_command(self, job, source=None):
+        base, ext = os.path.splitext(job.media_file)
+        ext = ext.lstrip(".").lower()
+        # 音声のみで変換の指定がなければ、音声ストリームをそのまま取り出す
+        profile = self.audio_profile or ("copy" if self.audio_only else None)
+        if profile is None:
+            return None
+        _, out_ext, codec_args = AUDIO_PROFILES[profile]
+        if profile == "copy":
+            if self.audio_only and ext in AUDIO_EXTS:
+                return None
+            out_ext = AUDIO_REMUX_EXTS.get(ext, "m4a")
+        elif self.audio_only and ext == out_ext:
+            return None
+        # 音声のみの場合は映像のデコードが発生しない
+        return ["ffmpeg", "-i", source or job.media_file, "-vn", *codec_args, "-y", f"{base}.{out_ext}"]
+
+    # 3段目: 変換（プロファイルに応じた音声の変換、または音声ストリームの取り出し）
+    def convert(self, job, ydl=None):
+        idx = job.idx
+        title = os.path.splitext(os.path.basename(job.media_file))[0]
+        cmd = self.conversion_command(job)
+        out_file = cmd[-1]
+        label = AUDIO_PROFILES[self.audio_profile or "copy"][0]
+        started = time.monotonic()
+        waited = started - (job.queued_at or started)
+
+        def on_progress(percent, position, speed, eta):
+            if self.is_cancelled(job):
+                raise TaskCancelled("キャンセルしました")
+            details = [f"{percent}%" if duration else format_eta(position)]
+            if speed:
+                details.append(f"{speed:.1f}x")
+            if eta is not None:
+                details.append(f"ETA {format_eta(eta)}")
+            msg = f"Converting {title} to {label} ({idx}/{len(self.tasks)}) {' '.join(details)}"
+            self.report(idx, percent, msg, force=False, state="converting", speed=None, ratio=speed, eta=eta)
+            state = ('converting', percent // 10)
+            if job.log_state != state:
+                job.log_state = state
+                self.log(msg, task=idx, speed=speed)
+
+        duration = (job.info or {}).get('duration')
+        try:
+            run_ffmpeg(cmd, duration, on_progress)
+        except TaskCancelled:
+            # 変換途中の出力は残さない（変換元は残るため、再開時に変換し直す）
+            if os.path.exists(out_file):
+                os.remove(out_file)
+            raise
+        elapsed = time.monotonic() - started
+        with self.lock:
+            self.transcode_stats['jobs'] += 1
+            self.transcode_stats['busy_seconds'] = round(self.transcode_stats['busy_seconds'] + elapsed, 2)
+            self.transcode_stats['wait_seconds'] = round(self.transcode_stats['wait_seconds'] + waited, 2)
+        msg = f"Conversion finished: {title} ({elapsed:.1f}s)"
+        self.report(idx, 100, msg)
+        self.log(msg, task=idx, seconds=round(elapsed, 2), waited=round(waited, 2))
+
+        if self.audio_only and not self.keep_source:
+            # 音声のみの場合、変換元は中間ファイルなので残さない
+            if os.path.exists(out_file):
+                os.remove(job.media_file)
+            self.complete(job, [out_file])
+        else:
+            self.complete(job, [job.media_file, out_file])
+
+# 入力（1行ごとに「URL,出力名」、出力名は任意）をタスクの一覧に変換する
+def parse_tasks(lines):
+    tasks = []
+    for line in lines:
+        task = parse_task_line(line)
+        if task:
+            tasks.append(task)
+    return tasks
+
+# 1行分の「URL,出力名」を (URL, 出力名) にする（空行は None）
+def parse_task_line(line):
+    if not line.strip():
+        return None
+    parts = line.split(",", maxsplit=1)
+    url = parts[0].strip()
+    filename = parts[1].strip() if len(parts) > 1 else None
+    return (url, filename or None)
+
+# URL として扱える形か（http/https でホスト名がある）の簡易チェック（通信はしない）
+def is_valid_url(url):
+    parsed = urlparse(url)
+    return parsed.scheme in ("http", "https") and bool(parsed.netloc)
+
+# 同じ動画を指すタスクを1つにまとめる（通信はせず、extractor_key で URL から動画を判定する）
+# まとめるのは動画 ID が同じ URL だけで、プレイリスト・チャンネルは同じ URL の場合に限る
+# （中の動画の重複は展開時に除く）
+# 出力名は最初に指定されたものを使い、それ以外の出力名は (タスク番号: [出力名, ...]) として返す
+# まとめたタスクごとの記録用のキー（DownloadEngine.task_key と同じもの）も合わせて返す
+def dedupe_tasks(tasks):
+    merged = {}
+    for url, filename in tasks:
+        found = extractor_key(url)
+        key = found[0] if found and found[1] == 'video' else url
+        entry = merged.setdefault(key, [url, [], found[0] if found else url])
+        if filename and filename not in entry[1]:
+            entry[1].append(filename)
+    unique, aliases, keys = [], {}, []
+    for idx, (url, names, task_key) in enumerate(merged.values(), 1):
+        unique.append((url, names[0] if names else None))
+        keys.append(task_key)
+        if len(names) > 1:
+            aliases[idx] = names[1:]
+    return unique, aliases, keys
@@ -0,0 +1,188 @@
+import os
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+
+# 分割ダウンロード（1つのファイルを複数の Range リクエストで同時に取得する）
+# yt_dlp を読み込むため、downloader.load_yt_dlp() 経由で必要になってから import する
+from yt_dlp import YoutubeDL
+from yt_dlp.downloader import get_suitable_downloader
+from yt_dlp.downloader.http import HttpFD
+from yt_dlp.networking import Request
+from yt_dlp.networking.exceptions import RequestError
+
+MIN_SEGMENT_SIZE = 1024 * 1024
+# サーバー側で1リクエストあたりの速度を絞られにくい大きさ（YouTube の http_chunk_size と同じ）
+MAX_SEGMENT_SIZE = 10 * 1024 * 1024
+BLOCK_SIZE = 64 * 1024
+
+class SegmentError(Exception):
+    pass
+
+# 通常の HTTP ダウンロードを、バイト範囲ごとの同時取得に置き換える
+# 一時ファイルを最終サイズで確保し、各スレッドが自分の範囲の位置に直接書き込む。
+# 完了した範囲は「一時ファイル名.segments」に記録し、中断後はその続きから取得する。
+# 確保した一時ファイルは通常の .part とは別の名前にする（同じ名前だと、分割せずに再開したときに
+# HttpFD が確保済みのサイズまで取得済みとみなし、末尾から続きを要求して失敗する）。
+# 範囲指定に対応していないサーバーやサイズが分からない場合は通常の HttpFD に任せる
+class SegmentedHttpFD(HttpFD):
+    segments = 1
+
+    def real_download(self, filename, info_dict):
+        if self.segments <= 1 or info_dict.get('is_live'):
+            return super().real_download(filename, info_dict)
+        url = info_dict['url']
+        headers = dict(info_dict.get('http_headers') or {})
+        try:
+            total = self.probe_size(url, headers)
+        except Exception as e:
+            self.report_warning(f"分割ダウンロードを使わずに取得します: {e}")
+            total = None
+        if not total or total < MIN_SEGMENT_SIZE * 2:
+            return super().real_download(filename, info_dict)
+
+        chunk_limit = (info_dict.get('downloader_options') or {}).get('http_chunk_size') or MAX_SEGMENT_SIZE
+        segment_size = max(MIN_SEGMENT_SIZE, min(math.ceil(total / self.segments), chunk_limit))
+        ranges = [(start, min(start + segment_size, total) - 1) for start in range(0, total, segment_size)]
+
+        tmpfilename = filename + ".segmented.part"
+        state_file = tmpfilename + ".segments"
+        done = self.load_state(state_file, tmpfilename, total, segment_size)
+        if done is None:
+            # 最終サイズで確保しておき、各範囲を位置指定で書き込む
+            with open(tmpfilename, "wb") as f:
+                f.truncate(total)
+            done = set()
+
+        lock = threading.Lock()
+        # どれかの範囲が失敗したら（一時停止・キャンセルによる中断を含む）、他の範囲も打ち切る
+        stop = threading.Event()
+        progress = {
+            'downloaded': sum(ranges[i][1] - ranges[i][0] + 1 for i in done),
+            'started': time.time(),
+        }
+        resumed = progress['downloaded']
+
+        def report():
+            elapsed = time.time() - progress['started']
+            speed = (progress['downloaded'] - resumed) / elapsed if elapsed > 0 else None
+            self._hook_progress({
+                'status': 'downloading',
+                'downloaded_bytes': progress['downloaded'],
+                'total_bytes': total,
+                'tmpfilename': tmpfilename,
+                'filename': filename,
+                'elapsed': elapsed,
+                'speed': speed,
+                'eta': (total - progress['downloaded']) / speed if speed else None,
+            }, info_dict)
+
+        def fetch(index):
+            start, end = ranges[index]
+            position = start
+            retries = self.params.get('retries', 10)
+            for attempt in range(retries + 1):
+                if stop.is_set():
+                    return
+                try:
+                    request = Request(url, headers={**headers, 'Range': f"bytes={position}-{end}"})
+                    with self.ydl.urlopen(request) as response, open(tmpfilename, "r+b") as f:
+                        if response.status != 206:
+                            raise SegmentError(f"範囲指定に対応していない応答です（HTTP {response.status}）")
+                        f.seek(position)
+                        while position <= end and not stop.is_set():
+                            block = response.read(min(BLOCK_SIZE, end - position + 1))
+                            if not block:
+                                break
+                            f.write(block)
+                            position += len(block)
+                            with lock:
+                                progress['downloaded'] += len(block)
+                                report()
+                    if position > end or stop.is_set():
+                        break
+                except SegmentError:
+                    raise
+                except (RequestError, OSError):
+                    # 通信エラーだけ再試行する（進捗の通知からの中断などはそのまま伝える）
+                    if attempt >= retries:
+                        raise
+                    stop.wait(min(2 ** attempt, 30))
+            else:
+                raise SegmentError(f"範囲 {start}-{end} を取得できませんでした")
+            if position <= end:
+                # 打ち切った範囲は完了として記録しない（再開時に続きから取得する）
+                return
+            with lock:
+                done.add(index)
+                self.save_state(state_file, total, segment_size, done)
+
+        pending = [i for i in range(len(ranges)) if i not in done]
+        # 失敗した時点でまだ始まっていない範囲は取り消し、新しい Range リクエストを出さない
+        with ThreadPoolExecutor(max_workers=self.segments) as pool:
+            finished, _ = wait([pool.submit(fetch, i) for i in pending], return_when=FIRST_EXCEPTION)
+            failed = next((future for future in finished if future.exception()), None)
+            if failed:
+                stop.set()
+                pool.shutdown(cancel_futures=True)
+                failed.result()
+
+        if os.path.getsize(tmpfilename) != total:
+            raise SegmentError("ダウンロードしたファイルのサイズが一致しません")
+        os.remove(state_file)
+        self.try_rename(tmpfilename, filename)
+        self._hook_progress({
+            'status': 'finished',
+            'downloaded_bytes': total,
+            'total_bytes': total,
+            'filename': filename,
+            'elapsed': time.time() - progress['started'],
+        }, info_dict)
+        return True
+
+    # 先頭1バイトだけ要求し、範囲指定への対応と全体のサイズを確認する
+    def probe_size(self, url, headers):
+        with self.ydl.urlopen(Request(url, headers={**headers, 'Range': "bytes=0-0"})) as response:
+            content_range = response.headers.get('Content-Range') or ""
+            if response.status != 206 or "/" not in content_range:
+                return None
+            total = content_range.rsplit("/", 1)[1]
+            return int(total) if total.isdigit() else None
+
+    @staticmethod
+    def load_state(state_file, tmpfilename, total, segment_size):
+        try:
+            with open(state_file, encoding="utf-8") as f:
+                state = json.load(f)
+            if (state.get('total') != total or state.get('segment_size') != segment_size
+                    or os.path.getsize(tmpfilename) != total):
+                return None
+            return set(state.get('done', []))
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def save_state(state_file, total, segment_size, done):
+        with open(state_file, "w", encoding="utf-8") as f:
+            json.dump({'total': total, 'segment_size': segment_size, 'done': sorted(done)}, f)
+
+# HTTP で取得するフォーマットだけ SegmentedHttpFD に差し替えた YoutubeDL
+# （DASH/HLS の断片は concurrent_fragment_downloads で同時取得する）
+class SegmentedYoutubeDL(YoutubeDL):
+    segments = 1
+
+    def dl(self, name, info, subtitle=False, test=False):
+        if (self.segments <= 1 or subtitle or test or name == '-' or not info.get('url')
+                or get_suitable_downloader(info, self.params) is not HttpFD):
+            return super().dl(name, info, subtitle, test)
+        # 以下は YoutubeDL.dl と同じ手順（ダウンローダーのクラスだけ差し替える）
+        fd = SegmentedHttpFD(self, self.params)
+        fd.segments = self.segments
+        for ph in self._progress_hooks:
+            fd.add_progress_hook(ph)
+        new_info = self._copy_infodict(info)
+        if new_info.get('http_headers') is None:
+            new_info['http_headers'] = self._calc_headers(new_info)
+        return fd.download(name, new_info, subtitle)
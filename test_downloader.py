@@ -0,0 +1,229 @@
+import io
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+import unittest
+from collections import Counter
+from unittest import mock
+import downloader
+from downloader import DownloadEngine, MetadataCache, dedupe_tasks, video_key
+
+# 通信しない YoutubeDL の代わり（プレイリストの URL は3本の動画に展開し、それ以外は1本の動画として扱う）
+class FakeYoutubeDL:
+    lock = threading.Lock()
+    extracted = Counter()
+
+    def __init__(self, params):
+        self.params = dict(params, outtmpl={'default': params['outtmpl']})
+
+    def extract_info(self, url, download=False):
+        with self.lock:
+            self.extracted[url] += 1
+        if "playlist" in url:
+            return {'_type': 'playlist', 'title': "list", 'entries': [
+                {'_type': 'url', 'ie_key': "Youtube", 'id': f"child{i:06d}", 'url': f"https://www.youtube.com/watch?v=child{i:06d}"}
+                for i in range(3)
+            ]}
+        return {'id': url[-11:], 'title': url[-11:], 'ext': "mp4", 'url': url}
+
+    def process_ie_result(self, info, download=True):
+        path = os.path.join(os.path.dirname(self.params['outtmpl']['default']), info['id'] + ".mp4")
+        return dict(info, requested_downloads=[{'filepath': path}])
+
+    def close(self):
+        pass
+
+class VideoKeyTest(unittest.TestCase):
+    # noplaylist で動画1本だけを取得するため、list 付きの URL も動画ごとに別のキーになる
+    def test_watch_url_with_list(self):
+        a = video_key("https://www.youtube.com/watch?v=AAAAAAAAAAA&list=PLxyz")
+        b = video_key("https://www.youtube.com/watch?v=BBBBBBBBBBB&list=PLxyz")
+        self.assertEqual(a, "youtube AAAAAAAAAAA")
+        self.assertEqual(b, "youtube BBBBBBBBBBB")
+        self.assertEqual(video_key("https://www.youtube.com/watch?list=PLxyz&v=AAAAAAAAAAA&index=2"), a)
+
+    def test_playlist_url(self):
+        self.assertEqual(video_key("https://www.youtube.com/playlist?list=PLxyz"), "youtubetab PLxyz")
+
+class DedupeTasksTest(unittest.TestCase):
+    # 同じ動画の URL だけをまとめ、同じプレイリストから開いた別の動画はまとめない
+    def test_merges_only_same_video(self):
+        tasks, aliases, keys = dedupe_tasks([
+            ("https://www.youtube.com/watch?v=AAAAAAAAAAA&list=PLxyz", "g1"),
+            ("https://youtu.be/AAAAAAAAAAA", "g2"),
+            ("https://www.youtube.com/playlist?list=PLxyz", "g3"),
+            ("https://www.youtube.com/watch?v=BBBBBBBBBBB&list=PLxyz", "g4"),
+        ])
+        self.assertEqual([name for _, name in tasks], ["g1", "g3", "g4"])
+        self.assertEqual(aliases, {1: ["g2"]})
+        self.assertEqual(keys, ["youtube AAAAAAAAAAA", "youtubetab PLxyz", "youtube BBBBBBBBBBB"])
+
+    # 数万件のバッチでも URL ごとに抽出器を照合するのは1回だけ
+    def test_keys_are_computed_once(self):
+        urls = [f"https://www.youtube.com/watch?v=A{i:010d}" for i in range(5000)]
+        downloader.extractor_key.cache_clear()
+        with mock.patch.object(downloader, "extractor_classes", wraps=downloader.extractor_classes) as classes, \
+                mock.patch.object(downloader, "video_key", wraps=downloader.video_key) as key:
+            with tempfile.TemporaryDirectory() as tmp, mock.patch.object(downloader, "youtube_dl_class", lambda: FakeYoutubeDL):
+                engine = DownloadEngine([(url, None) for url in urls], tmp, max_workers=4, use_journal=False,
+                                        host_rate=0, check_disk_space=False)
+                engine.run()
+        self.assertEqual(classes.call_count, len(urls))
+        self.assertEqual(key.call_count, 0)
+        self.assertEqual(downloader.extractor_key.cache_info().currsize, len(urls))
+
+class PlaylistSchedulingTest(unittest.TestCase):
+    # 入力の登録中にプレイリストが展開されても、追加したタスクを二重に登録しない
+    def test_expanded_tasks_are_scheduled_once(self):
+        FakeYoutubeDL.extracted.clear()
+        urls = ["https://www.youtube.com/playlist?list=PLtest"] + [
+            f"https://www.youtube.com/watch?v=input{i:06d}" for i in range(300)]
+
+        def on_task_update(idx, fields):
+            # 登録のループを遅くし、その間に展開が終わるようにする
+            if fields.get("state") == "pending":
+                time.sleep(0.001)
+
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(downloader, "youtube_dl_class", lambda: FakeYoutubeDL):
+            engine = DownloadEngine([(url, None) for url in urls], tmp, max_workers=4, on_task_update=on_task_update,
+                                    use_journal=False, host_rate=0, check_disk_space=False)
+            results = engine.run()
+        self.assertEqual(engine.remaining, 0)
+        self.assertEqual(len(results), 304)
+        self.assertEqual(max(FakeYoutubeDL.extracted.values()), 1)
+        self.assertEqual(len(FakeYoutubeDL.extracted), 304)
+
+class ResumeTest(unittest.TestCase):
+    # 前回完了したタスクは記録を書き直さない（数万件のジョブの再開でタスクごとに fsync しない）
+    def test_restored_tasks_are_not_journaled_again(self):
+        tasks = [(f"https://www.youtube.com/watch?v=done{i:07d}", None) for i in range(1000)]
+        tasks.append(("https://www.youtube.com/watch?v=pending0000", None))
+        states = {idx: {"state": "done", "result": f"file{idx}"} for idx in range(1, 1001)}
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(downloader, "youtube_dl_class", lambda: FakeYoutubeDL):
+            journal = downloader.JobJournal(os.path.join(tmp, downloader.JOURNAL_FILENAME))
+            journal.start(tasks, {})
+            journal.close()
+            with mock.patch.object(downloader.os, "fsync") as fsync:
+                engine = DownloadEngine(tasks, tmp, max_workers=2, resume_states=states, host_rate=0,
+                                        check_disk_space=False)
+                results = engine.run()
+        self.assertEqual(results[:2], ["file1", "file2"])
+        self.assertEqual(len(results), 1001)
+        self.assertLess(fsync.call_count, 10)
+
+class JobJournalTest(unittest.TestCase):
+    def write(self, tmp, records, tail=""):
+        path = os.path.join(tmp, downloader.JOURNAL_FILENAME)
+        with open(path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+            f.write(tail)
+        return path
+
+    # クラッシュで書きかけになった最後の行は無視し、それまでの状態を使う
+    def test_half_written_line(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = self.write(tmp, [
+                {"event": "job", "tasks": [["u1", None], ["u2", "b"]], "options": {}},
+                {"event": "task", "index": 1, "state": "done", "result": "f1"},
+            ], tail='{"event": "task", "index": 2, "sta')
+            job = downloader.JobJournal.load(path)
+        self.assertEqual(job["tasks"], [("u1", None), ("u2", "b")])
+        self.assertEqual(job["states"][1]["state"], "done")
+        self.assertNotIn(2, job["states"])
+
+    # 追加したタスクの記録が欠けている場合は、欠けた番号以降を捨てる
+    def test_added_tasks_with_gap(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = self.write(tmp, [
+                {"event": "job", "tasks": [["list", None]], "options": {}},
+                {"event": "tasks", "index": 2, "tasks": [["c1", None], ["c2", None]]},
+                {"event": "tasks", "index": 5, "tasks": [["c4", None]]},
+            ])
+            job = downloader.JobJournal.load(path)
+        self.assertEqual(job["tasks"], [("list", None), ("c1", None), ("c2", None)])
+
+    # 古い記録の to_mp3 は mp3 プロファイルとして再開し、記録にないオプションは呼び出し元の設定のままにする
+    def test_resume_options_from_old_journal(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.write(tmp, [
+                {"event": "job", "tasks": [["u1", None], ["u2", None]],
+                 "options": {"to_mp3": True, "audio_only": True, "aliases": {"1": ["x"]}}},
+                {"event": "task", "index": 1, "state": "done", "result": "f1"},
+            ])
+            options = downloader.resume_engine_options(downloader.load_unfinished_job(tmp))
+        self.assertEqual(options["audio_profile"], "mp3")
+        self.assertEqual(options["aliases"], {1: ["x"]})
+        self.assertNotIn("segments", options)
+        self.assertEqual(options["resume_states"][1]["result"], "f1")
+
+def http_error(status):
+    networking = downloader.load_yt_dlp().networking
+    return networking.exceptions.HTTPError(networking.Response(io.BytesIO(b""), "https://example.com/", {}, status=status))
+
+# yt-dlp が投げる形（DownloadError の exc_info に原因の例外を持つ）に包む
+def download_error(cause):
+    try:
+        raise cause
+    except Exception:
+        return downloader.load_yt_dlp().utils.DownloadError(f"ERROR: {cause}", sys.exc_info())
+
+class ErrorClassificationTest(unittest.TestCase):
+    def test_transient_error(self):
+        utils = downloader.load_yt_dlp().utils
+        transport_error = downloader.load_yt_dlp().networking.exceptions.TransportError
+        self.assertTrue(downloader.is_transient_error(download_error(http_error(503))))
+        self.assertTrue(downloader.is_transient_error(download_error(http_error(429))))
+        self.assertFalse(downloader.is_transient_error(download_error(http_error(404))))
+        self.assertTrue(downloader.is_transient_error(utils.ExtractorError("failed", cause=transport_error("reset"))))
+        self.assertTrue(downloader.is_transient_error(RuntimeError("The read operation timed out")))
+        self.assertFalse(downloader.is_transient_error(utils.ExtractorError("Video unavailable", expected=True)))
+
+    def test_expired_url_error(self):
+        self.assertTrue(downloader.is_expired_url_error(download_error(http_error(410))))
+        self.assertTrue(downloader.is_expired_url_error(download_error(http_error(403))))
+        self.assertFalse(downloader.is_expired_url_error(download_error(http_error(503))))
+        self.assertTrue(downloader.is_expired_url_error(RuntimeError("HTTP Error 403: Forbidden")))
+
+    # 原因が循環していても止まる
+    def test_cyclic_chain(self):
+        a, b = RuntimeError("a"), RuntimeError("b")
+        a.__cause__, b.__cause__ = b, a
+        self.assertEqual(list(downloader.exception_chain(a)), [a, b])
+        self.assertFalse(downloader.is_transient_error(a))
+
+class MetadataCacheTest(unittest.TestCase):
+    def test_url_expiry(self):
+        self.assertEqual(MetadataCache.url_expiry({'url': "https://a/videoplayback?expire=2000&x=1"}), 2000)
+        self.assertEqual(MetadataCache.url_expiry({'requested_formats': [
+            {'url': "https://a/videoplayback?expire=3000"},
+            {'url': "https://a/videoplayback/expire/2500/itag/140"},
+        ]}), 2500)
+        self.assertIsNone(MetadataCache.url_expiry({'url': "https://a/video.mp4"}))
+
+    # 有効期限は TTL と、フォーマット URL の期限の少し前のうち早いほう
+    def test_ttl(self):
+        cache = MetadataCache(ttl=600, expire_margin=60)
+        with mock.patch.object(downloader.time, "time", return_value=1000.0):
+            cache.put("a", {'url': "https://a/v.mp4"})
+            cache.put("b", {'url': "https://a/v?expire=1300"})
+        with mock.patch.object(downloader.time, "time", return_value=1239.0):
+            self.assertIsNotNone(cache.get("b"))
+        with mock.patch.object(downloader.time, "time", return_value=1240.0):
+            self.assertIsNone(cache.get("b"))
+            self.assertIsNotNone(cache.get("a"))
+        with mock.patch.object(downloader.time, "time", return_value=1600.0):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache.entries), 0)
+
+    # 返した情報を書き換えてもキャッシュには影響しない
+    def test_returns_copy(self):
+        cache = MetadataCache()
+        cache.put("a", {'title': "x"})
+        cache.get("a")['title'] = "y"
+        self.assertEqual(cache.get("a")['title'], "x")
+
+if __name__ == "__main__":
+    unittest.main()
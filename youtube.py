@@ -1,102 +1,269 @@
+import time
+STARTUP_T0 = time.perf_counter()
 import sys
 import os
-import subprocess
-from datetime import datetime
+import csv
+import json
+import threading
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QLabel, QLineEdit, QPushButton,
     QVBoxLayout, QHBoxLayout, QFileDialog, QMessageBox,
-    QCheckBox, QTextEdit, QProgressBar, QDialog
+    QCheckBox, QPlainTextEdit, QProgressBar, QDialog, QSpinBox, QComboBox, QTableView, QHeaderView, QMenu
 )
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
-import yt_dlp
+from PyQt6.QtCore import Qt, QThread, QTimer, QMetaObject, QAbstractTableModel, QModelIndex, pyqtSignal
+from PyQt6.QtGui import QColor
+from downloader import (
+    DownloadEngine, MetadataCache, AUDIO_PROFILES, create_logger, default_worker_count, format_bytes, format_eta,
+    is_valid_url, load_unfinished_job, load_yt_dlp, parse_task_line, parse_tasks, resume_engine_options,
+    MAX_SEGMENTS, MAX_WORKERS_LIMIT
+)
+
+# 起動時間の計測（プロセス開始からの経過ミリ秒を段階ごとに記録する）
+class StartupTimeline:
+    def __init__(self, t0):
+        self.t0 = t0
+        self.marks = {}
 
-# ログ作成
-def create_logger(output_dir="logs"):
-    os.makedirs(output_dir, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    log_path = os.path.join(output_dir, f"{timestamp}.log")
-    return open(log_path, "w", encoding="utf-8")
+    def mark(self, name):
+        self.marks[name] = round((time.perf_counter() - self.t0) * 1000, 1)
 
-# ダウンロードと変換のスレッド
+startup = StartupTimeline(STARTUP_T0)
+startup.mark("imports")
+
+# ダウンロードと変換のスレッド（処理本体は downloader.DownloadEngine）
 class DownloadThread(QThread):
     progress_update = pyqtSignal(int, str)
+    task_update = pyqtSignal(int, dict)
     finished_signal = pyqtSignal(list)
 
-    def __init__(self, tasks, output_dir, to_mp3, cookies_file=None, log_file=None):
+    def __init__(self, tasks, output_dir, audio_profile, **options):
         super().__init__()
-        self.tasks = tasks
-        self.output_dir = output_dir
-        self.to_mp3 = to_mp3
-        self.cookies_file = cookies_file
-        self.log_file = log_file
+        self.engine = DownloadEngine(tasks, output_dir, audio_profile, on_progress=self.progress_update.emit,
+                                     on_task_update=self.task_update.emit, **options)
+
+    def run(self):
+        self.finished_signal.emit(self.engine.run())
+
+# URL 一覧の読み込み（ファイルまたは大きな貼り付け）
+# GUI スレッドを止めないよう別スレッドで1行ずつ読み、途中の件数を通知する。
+# 読み込んだタスクは入力欄には入れず、(URL, 出力名) のタプルの一覧として持つ
+class ImportThread(QThread):
+    progress = pyqtSignal(int, int)
+    finished_signal = pyqtSignal(object, int, str)
+    REPORT_INTERVAL = 0.1
 
-    def log(self, message):
-        if self.log_file:
-            self.log_file.write(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}\n")
-            self.log_file.flush()
+    def __init__(self, path=None, text=None):
+        super().__init__()
+        self.path = path
+        self.text = text
+
+    def lines(self):
+        if self.text is not None:
+            yield from self.text.splitlines()
+            return
+        with open(self.path, encoding="utf-8-sig", errors="replace", newline="") as f:
+            if self.path.lower().endswith(".csv"):
+                # CSV は引用符で囲まれた出力名（カンマを含むもの）に対応する
+                for row in csv.reader(f):
+                    yield ",".join(row[:2])
+            else:
+                for line in f:
+                    yield line
 
     def run(self):
-        results = []
-        os.makedirs(self.output_dir, exist_ok=True)
-
-        for idx, (url, filename) in enumerate(self.tasks, 1):
-            try:
-                def progress_hook(d):
-                    if d['status'] == 'downloading':
-                        percent = int(d.get('downloaded_bytes', 0) / max(d.get('total_bytes',1),1) * 100)
-                        msg = f"Downloading {filename or 'video'} ({idx}/{len(self.tasks)})"
-                        self.progress_update.emit(percent, msg)
-                        self.log(msg)
-                    elif d['status'] == 'finished':
-                        msg = f"Download finished: {filename or 'video'} ({idx}/{len(self.tasks)})"
-                        self.progress_update.emit(100, msg)
-                        self.log(msg)
-
-                ydl_opts = {
-                    'format': 'bestvideo+bestaudio/best',
-                    'outtmpl': os.path.join(self.output_dir, f"{filename}.%(ext)s") if filename else os.path.join(self.output_dir, "%(title)s.%(ext)s"),
-                    'merge_output_format': 'mp4',
-                    'noplaylist': True,
-                    'quiet': True,
-                    'progress_hooks': [progress_hook],
-                }
-
-                if self.cookies_file and os.path.exists(self.cookies_file):
-                    ydl_opts['cookiefile'] = self.cookies_file
-
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=True)
-                    title = filename or info.get('title', 'output')
-                    mp4_file = os.path.join(self.output_dir, f"{title}.mp4")
-
-                mp3_file = None
-                if self.to_mp3:
-                    mp3_file = os.path.join(self.output_dir, f"{title}.mp3")
-                    cmd = ["ffmpeg", "-i", mp4_file, "-vn", "-ab", "192k", "-ar", "44100", "-y", mp3_file]
-                    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-                    for line in process.stdout:
-                        if "time=" in line:
-                            msg = f"Converting {title} to MP3 ({idx}/{len(self.tasks)})"
-                            self.progress_update.emit(50, msg)
-                            self.log(msg)
-                    process.wait()
-                    msg = f"Conversion finished: {title}"
-                    self.progress_update.emit(100, msg)
-                    self.log(msg)
-
-                results.append(f"{mp4_file}" + (f"\n{mp3_file}" if mp3_file else ""))
-
-            except Exception as e:
-                err_msg = str(e)
-                if "The following content is not available on this app" in err_msg:
-                    err_msg += (
-                        "\n\nこの動画はYouTubeのアプリ限定コンテンツです。\n"
-                        "cookies.txt を使用してログイン状態を反映するとダウンロード可能になる場合があります。"
-                    )
-                results.append(f"URL: {url} でエラー発生: {err_msg}")
-                self.log(f"ERROR: URL {url} - {err_msg}")
-
-        self.finished_signal.emit(results)
+        tasks, invalid = [], 0
+        error = ""
+        last = time.monotonic()
+        try:
+            for line in self.lines():
+                task = parse_task_line(line)
+                if task is None:
+                    continue
+                if is_valid_url(task[0]):
+                    tasks.append(task)
+                else:
+                    invalid += 1
+                now = time.monotonic()
+                if now - last >= self.REPORT_INTERVAL:
+                    last = now
+                    self.progress.emit(len(tasks), invalid)
+        except (OSError, csv.Error) as e:
+            error = str(e)
+        self.finished_signal.emit(tasks, invalid, error)
+
+# URL の入力欄
+# 大量の行の貼り付けと、.txt / .csv ファイルのドロップは入力欄に入れず、読み込みとして扱う
+class UrlInput(QPlainTextEdit):
+    LARGE_PASTE_LINES = 500
+    files_dropped = pyqtSignal(list)
+    large_paste = pyqtSignal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.setAcceptDrops(True)
+
+    def url_files(self, mime):
+        if not mime.hasUrls():
+            return []
+        return [url.toLocalFile() for url in mime.urls()
+                if url.isLocalFile() and url.toLocalFile().lower().endswith((".txt", ".csv"))]
+
+    def canInsertFromMimeData(self, source):
+        return bool(self.url_files(source)) or super().canInsertFromMimeData(source)
+
+    def insertFromMimeData(self, source):
+        files = self.url_files(source)
+        if files:
+            self.files_dropped.emit(files)
+            return
+        if source.hasText():
+            text = source.text()
+            if text.count("\n") >= self.LARGE_PASTE_LINES:
+                self.large_paste.emit(text)
+                return
+        super().insertFromMimeData(source)
+
+    def dragEnterEvent(self, event):
+        if self.url_files(event.mimeData()):
+            event.acceptProposedAction()
+        else:
+            super().dragEnterEvent(event)
+
+    def dragMoveEvent(self, event):
+        if self.url_files(event.mimeData()):
+            event.acceptProposedAction()
+        else:
+            super().dragMoveEvent(event)
+
+    def dropEvent(self, event):
+        files = self.url_files(event.mimeData())
+        if files:
+            event.acceptProposedAction()
+            self.files_dropped.emit(files)
+        else:
+            super().dropEvent(event)
+
+# タスクごとの進捗の一覧（1行1タスク）
+# 通知のたびに画面を更新すると数千件のバッチで重くなるため、変更のあった行を記録しておき、
+# タイマーで一定間隔ごとに行の追加と dataChanged をまとめて通知する（描画は QTableView が表示中の行だけ行う）
+class TaskTableModel(QAbstractTableModel):
+    COLUMNS = ["状態", "名前", "進捗", "サイズ", "速度", "残り時間", "保存先 / エラー"]
+    STATE_LABELS = {
+        "pending": "待機中", "resolving": "解析中", "waiting": "空き容量待ち", "downloading": "ダウンロード中",
+        "downloaded": "ダウンロード完了", "converting": "変換中", "retrying": "再試行待ち",
+        "paused": "一時停止中", "skipped": "スキップ", "cancelled": "キャンセル", "done": "完了", "failed": "失敗",
+    }
+    FINISHED_STATES = ("done", "failed", "cancelled")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.visible_rows = 0
+        self.dirty = set()
+        self.counts = dict.fromkeys(self.FINISHED_STATES, 0)
+        self.timer = QTimer(self)
+        self.timer.setInterval(200)
+        self.timer.timeout.connect(self.flush)
+        self.timer.start()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.visible_rows
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            return self.COLUMNS[section]
+        return str(section + 1)
+
+    def update_task(self, idx, fields):
+        while len(self.rows) < idx:
+            self.rows.append({})
+        row = self.rows[idx - 1]
+        state = fields.get("state", row.get("state"))
+        if state != row.get("state"):
+            # 完了・失敗・キャンセルの件数は状態が変わったときだけ数え直す
+            for key in self.FINISHED_STATES:
+                self.counts[key] += (state == key) - (row.get("state") == key)
+        row.update(fields)
+        self.dirty.add(idx - 1)
+
+    def flush(self):
+        if len(self.rows) > self.visible_rows:
+            self.beginInsertRows(QModelIndex(), self.visible_rows, len(self.rows) - 1)
+            self.visible_rows = len(self.rows)
+            self.endInsertRows()
+        if self.dirty:
+            first, last = min(self.dirty), max(self.dirty)
+            self.dirty.clear()
+            self.dataChanged.emit(self.index(first, 0), self.index(last, len(self.COLUMNS) - 1))
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        column = index.column()
+        state = row.get("state")
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return self.STATE_LABELS.get(state, state or "")
+            if column == 1:
+                return row.get("name") or row.get("url", "")
+            if column == 2:
+                return f"{row['percent']}%" if row.get("percent") is not None else ""
+            if column == 3:
+                if row.get("downloaded") is None:
+                    return ""
+                return format_bytes(row["downloaded"]) + (f" / {format_bytes(row['total'])}" if row.get("total") else "")
+            if column == 4:
+                if row.get("ratio"):
+                    return f"{row['ratio']:.1f}x"
+                return f"{format_bytes(row['speed'])}/s" if row.get("speed") else ""
+            if column == 5:
+                return format_eta(row["eta"]) if row.get("eta") is not None else ""
+            if column == 6:
+                text = row.get("error") if state in ("failed", "retrying", "cancelled") else row.get("output")
+                # 複数のファイルは1行目だけ表示し、全体はツールチップで表示する
+                return (text or "").split("\n", 1)[0]
+        elif role == Qt.ItemDataRole.ToolTipRole:
+            if column == 1:
+                return row.get("url")
+            if column == 6:
+                return row.get("error") if state in ("failed", "retrying", "cancelled") else row.get("output")
+        elif role == Qt.ItemDataRole.ForegroundRole:
+            if state == "failed":
+                return QColor("red")
+            if state in ("done", "skipped", "cancelled"):
+                return QColor("gray")
+        elif role == Qt.ItemDataRole.TextAlignmentRole and column in (2, 3, 4, 5):
+            return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        return None
+
+    def summary(self):
+        total = len(self.rows)
+        done, failed, cancelled = (self.counts[key] for key in self.FINISHED_STATES)
+        text = f"全 {total} 件 ／ 完了 {done} 件 ／ 失敗 {failed} 件"
+        if cancelled:
+            text += f" ／ キャンセル {cancelled} 件"
+        return text + f" ／ 残り {total - done - failed - cancelled} 件"
+
+# 進捗の一覧のダイアログ
+# 実行中に閉じようとした場合は、処理をキャンセルするか確認する（閉じてもバッチは止まらないため）
+class ProgressDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.engine = None
+
+    def closeEvent(self, event):
+        if self.engine is None:
+            return super().closeEvent(event)
+        answer = QMessageBox.question(self, "キャンセル", "実行中のダウンロードをキャンセルしますか？")
+        if answer == QMessageBox.StandardButton.Yes:
+            self.engine.cancel()
+        event.ignore()
 
 # メインのGUI
 class YouTubeDownloader(QWidget):
@@ -104,7 +271,14 @@ class YouTubeDownloader(QWidget):
         super().__init__()
         self.setWindowTitle("YouTube MP4 & MP3 ダウンローダー (Cookies対応)")
         self.setFixedSize(700, 500)
-        self.log_file = create_logger()
+        self.logger = create_logger()
+        # 解析結果はバッチをまたいで使い回す（再実行・再試行で同じ動画を解析し直さない）
+        self.metadata_cache = MetadataCache()
+        # ファイルや大きな貼り付けから読み込んだタスク（入力欄の内容とは別に持つ）
+        self.imported_tasks = []
+        self.imported_invalid = 0
+        self.import_threads = []
+        self.pending_imports = []
         self.init_ui()
 
     def init_ui(self):
@@ -120,9 +294,44 @@ class YouTubeDownloader(QWidget):
         folder_layout.addWidget(browse_btn)
         layout.addLayout(folder_layout)
 
-        # MP3変換チェック
-        self.mp3_checkbox = QCheckBox("MP3に変換する")
-        layout.addWidget(self.mp3_checkbox)
+        # 音声の変換（MP3 など）
+        profile_layout = QHBoxLayout()
+        self.profile_combo = QComboBox()
+        self.profile_combo.addItem("変換しない", None)
+        for name, (label, _, _) in AUDIO_PROFILES.items():
+            self.profile_combo.addItem(label, name)
+        profile_layout.addWidget(QLabel("音声の変換:"))
+        profile_layout.addWidget(self.profile_combo)
+        profile_layout.addStretch()
+        layout.addLayout(profile_layout)
+        self.audio_only_checkbox = QCheckBox("音声のみ（動画をダウンロードしない）")
+        layout.addWidget(self.audio_only_checkbox)
+        # 音声のみの変換では、ダウンロード中のデータをそのまま ffmpeg に渡せる
+        self.stream_checkbox = QCheckBox("ダウンロードしながら変換する（中間ファイルを作らない）")
+        self.keep_source_checkbox = QCheckBox("変換元の音声ファイルも保存する")
+        self.audio_only_checkbox.toggled.connect(self.update_stream_options)
+        self.profile_combo.currentIndexChanged.connect(self.update_stream_options)
+        self.update_stream_options()
+        layout.addWidget(self.stream_checkbox)
+        layout.addWidget(self.keep_source_checkbox)
+        self.archive_checkbox = QCheckBox("ダウンロード済みの動画をスキップする（保存先に履歴を記録）")
+        layout.addWidget(self.archive_checkbox)
+
+        # 同時ダウンロード数
+        workers_layout = QHBoxLayout()
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, MAX_WORKERS_LIMIT)
+        self.workers_spin.setValue(default_worker_count())
+        workers_layout.addWidget(QLabel("同時ダウンロード数:"))
+        workers_layout.addWidget(self.workers_spin)
+        # 1ファイルを複数の接続に分けて取得する数（1で分割しない）
+        self.segments_spin = QSpinBox()
+        self.segments_spin.setRange(1, MAX_SEGMENTS)
+        self.segments_spin.setValue(1)
+        workers_layout.addWidget(QLabel("1ファイルの分割数:"))
+        workers_layout.addWidget(self.segments_spin)
+        workers_layout.addStretch()
+        layout.addLayout(workers_layout)
 
         # Cookies指定
         cookies_layout = QHBoxLayout()
@@ -135,24 +344,94 @@ class YouTubeDownloader(QWidget):
         layout.addLayout(cookies_layout)
 
         # URL入力
-        self.urls_text = QTextEdit()
+        self.urls_text = UrlInput()
         self.urls_text.setPlaceholderText(
-            "URL と出力名を1行ずつ、カンマ区切りで入力\n例:\nhttps://youtube.com/xxxx,video1"
+            "URL と出力名を1行ずつ、カンマ区切りで入力（プレイリスト・チャンネルの URL も可）\n例:\nhttps://youtube.com/xxxx,video1\n"
+            ".txt / .csv ファイルのドロップ、大量の貼り付けは一覧として読み込みます"
         )
+        self.urls_text.files_dropped.connect(self.import_files)
+        self.urls_text.large_paste.connect(lambda text: self.start_import(text=text))
         layout.addWidget(QLabel("複数URLと出力名（任意）:"))
         layout.addWidget(self.urls_text)
+        import_layout = QHBoxLayout()
+        import_btn = QPushButton("ファイルから読み込む…")
+        import_btn.clicked.connect(self.browse_import)
+        clear_btn = QPushButton("読み込みをクリア")
+        clear_btn.clicked.connect(self.clear_imported)
+        self.import_label = QLabel()
+        import_layout.addWidget(import_btn)
+        import_layout.addWidget(clear_btn)
+        import_layout.addWidget(self.import_label)
+        import_layout.addStretch()
+        layout.addLayout(import_layout)
+        self.update_import_label()
 
         # ダウンロードボタン
-        download_btn = QPushButton("ダウンロード開始")
-        download_btn.clicked.connect(self.start_download)
-        layout.addWidget(download_btn)
+        self.download_btn = QPushButton("ダウンロード開始")
+        self.download_btn.clicked.connect(self.start_download)
+        layout.addWidget(self.download_btn)
         self.setLayout(layout)
 
+    def update_stream_options(self):
+        enabled = self.audio_only_checkbox.isChecked() and self.profile_combo.currentData() not in (None, "copy")
+        self.stream_checkbox.setEnabled(enabled)
+        self.keep_source_checkbox.setEnabled(enabled)
+
     def browse_folder(self):
         folder = QFileDialog.getExistingDirectory(self, "保存先フォルダを選択")
         if folder:
             self.folder_entry.setText(folder)
 
+    def browse_import(self):
+        files, _ = QFileDialog.getOpenFileNames(self, "URL一覧を読み込む", "", "URL一覧 (*.txt *.csv);;すべてのファイル (*)")
+        self.import_files(files)
+
+    def import_files(self, files):
+        for path in files:
+            self.start_import(path=path)
+
+    # 読み込みは1つずつ順番に行い、入力した順にタスクを並べる
+    def start_import(self, path=None, text=None):
+        self.pending_imports.append((path, text))
+        if not self.import_threads:
+            self.next_import()
+
+    def next_import(self):
+        if not self.pending_imports:
+            self.update_import_label()
+            return
+        path, text = self.pending_imports.pop(0)
+        thread = ImportThread(path, text)
+        thread.progress.connect(lambda count, invalid: self.update_import_label(count, invalid))
+        thread.finished_signal.connect(lambda tasks, invalid, error: self.import_finished(thread, path, tasks, invalid, error))
+        self.import_threads.append(thread)
+        thread.start()
+
+    def import_finished(self, thread, path, tasks, invalid, error):
+        thread.wait()
+        self.import_threads.remove(thread)
+        if error:
+            QMessageBox.critical(self, "エラー", f"{path} を読み込めませんでした: {error}")
+        self.imported_tasks.extend(tasks)
+        self.imported_invalid += invalid
+        self.next_import()
+
+    def clear_imported(self):
+        self.imported_tasks = []
+        self.imported_invalid = 0
+        self.update_import_label()
+
+    # 読み込み中は、読み込み中のファイルの件数を加えて表示する
+    def update_import_label(self, count=0, invalid=0):
+        total = len(self.imported_tasks) + count
+        invalid += self.imported_invalid
+        text = f"読み込み済み: {total} 件"
+        if invalid:
+            text += f"（無効な行 {invalid} 件）"
+        if self.import_threads:
+            text = "読み込み中… " + text
+        self.import_label.setText(text)
+
     def browse_cookies(self):
         file, _ = QFileDialog.getOpenFileName(self, "Cookiesファイル選択", "", "Cookiesファイル (*.txt)")
         if file:
@@ -160,58 +439,182 @@ class YouTubeDownloader(QWidget):
 
     def start_download(self):
         output_dir = self.folder_entry.text().strip() or "downloads"
-        to_mp3 = self.mp3_checkbox.isChecked()
+        engine_options = {
+            "audio_profile": self.profile_combo.currentData(),
+            "audio_only": self.audio_only_checkbox.isChecked(),
+            "stream_audio": self.stream_checkbox.isEnabled() and self.stream_checkbox.isChecked(),
+            "keep_source": self.keep_source_checkbox.isEnabled() and self.keep_source_checkbox.isChecked(),
+            "segments": self.segments_spin.value(),
+        }
+        use_archive = self.archive_checkbox.isChecked()
         cookies_file = self.cookies_entry.text().strip() or None
-        lines = self.urls_text.toPlainText().splitlines()
-
-        if not lines:
-            QMessageBox.critical(self, "エラー", "URLを入力してください")
+        max_workers = self.workers_spin.value()
+        if self.import_threads:
+            QMessageBox.information(self, "読み込み中", "URL一覧の読み込みが終わってから開始してください")
             return
+        lines = self.urls_text.toPlainText().splitlines()
 
-        tasks = []
-        for line in lines:
-            if not line.strip():
-                continue
-            parts = line.split(",", maxsplit=1)
-            url = parts[0].strip()
-            filename = parts[1].strip() if len(parts) > 1 else None
-            tasks.append((url, filename))
-
-        # プログレスダイアログ
+        # 中断したジョブが残っていれば再開するか確認する
+        unfinished = load_unfinished_job(output_dir)
+        if unfinished:
+            answer = QMessageBox.question(
+                self, "ジョブの再開",
+                f"前回中断したジョブがあります（全 {len(unfinished['tasks'])} 件中、残り {unfinished['pending']} 件）。\n"
+                "再開しますか？（「いいえ」を選ぶと入力したURLで新しく開始します）",
+            )
+            if answer == QMessageBox.StandardButton.Yes:
+                lines = None
+                tasks = unfinished["tasks"]
+                engine_options.update(resume_engine_options(unfinished))
+
+        if lines is not None:
+            tasks = self.imported_tasks + parse_tasks(lines)
+            if not tasks:
+                QMessageBox.critical(self, "エラー", "URLを入力してください")
+                return
+
+        # 進捗の一覧（全体の進捗と、タスクごとの状態の表）
+        # 一覧のモデルとタイマーはダイアログに持たせ、次のバッチで前のダイアログごと破棄する
+        if getattr(self, "progress_dialog", None):
+            self.progress_dialog.close()
+            self.progress_dialog.deleteLater()
+        dlg = ProgressDialog(self)
         self.progress_bar = QProgressBar()
         self.progress_bar.setRange(0, 100)
         self.progress_bar.setValue(0)
+        self.task_model = TaskTableModel(dlg)
+        table = QTableView()
+        table.setModel(self.task_model)
+        table.setWordWrap(False)
+        table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        # 行の高さを固定し、行数が多くてもスクロールや更新で高さを測り直さない
+        table.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        table.verticalHeader().setDefaultSectionSize(table.fontMetrics().height() + 6)
+        header = table.horizontalHeader()
+        for column, width in enumerate((110, 220, 50, 140, 90, 70)):
+            header.resizeSection(column, width)
+        header.setStretchLastSection(True)
+        # 選んだ行（タスク）だけの一時停止・再開・キャンセル
+        table.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        table.customContextMenuRequested.connect(lambda pos: self.task_menu(table, pos))
+        self.summary_label = QLabel("処理中…")
+        self.summary_timer = QTimer(dlg)
+        self.summary_timer.setInterval(500)
+        self.summary_timer.timeout.connect(lambda: self.summary_label.setText("処理中… " + self.task_model.summary()))
+        self.summary_timer.start()
+
+        # バッチ全体の一時停止・再開とキャンセル
+        self.pause_btn = QPushButton("一時停止")
+        self.pause_btn.clicked.connect(self.toggle_pause)
+        self.cancel_btn = QPushButton("キャンセル")
+        self.cancel_btn.clicked.connect(self.cancel_download)
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        buttons.addWidget(self.pause_btn)
+        buttons.addWidget(self.cancel_btn)
 
-        dlg = QDialog(self)
         dlg.setWindowTitle("進捗状況")
         dlg.setLayout(QVBoxLayout())
-        dlg.layout().addWidget(QLabel("処理中…"))
+        dlg.layout().addWidget(self.summary_label)
         dlg.layout().addWidget(self.progress_bar)
-        dlg.setModal(True)
-        dlg.setFixedSize(400, 100)
+        dlg.layout().addWidget(table)
+        dlg.layout().addLayout(buttons)
+        dlg.resize(900, 500)
         self.progress_dialog = dlg
 
         # スレッド起動
-        self.thread = DownloadThread(tasks, output_dir, to_mp3, cookies_file, self.log_file)
+        self.thread = DownloadThread(
+            tasks, output_dir, cookies_file=cookies_file, logger=self.logger, max_workers=max_workers,
+            use_archive=use_archive, metadata_cache=self.metadata_cache, **engine_options,
+        )
         self.thread.progress_update.connect(self.update_progress)
+        self.thread.task_update.connect(self.task_model.update_task)
         self.thread.finished_signal.connect(self.download_finished)
+        dlg.engine = self.thread.engine
         self.thread.start()
+        # 進捗の一覧はモーダルにしないため、実行中は次のバッチを開始できないようにする
+        self.download_btn.setEnabled(False)
 
         dlg.show()
 
+    def toggle_pause(self):
+        engine = self.thread.engine
+        if engine.paused:
+            engine.resume()
+            self.pause_btn.setText("一時停止")
+        else:
+            engine.pause()
+            self.pause_btn.setText("再開")
+
+    def cancel_download(self):
+        self.thread.engine.cancel()
+        self.pause_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(False)
+
+    def task_menu(self, table, pos):
+        engine = self.progress_dialog.engine
+        rows = sorted({index.row() for index in table.selectionModel().selectedRows()})
+        if engine is None or not rows:
+            return
+        menu = QMenu(table)
+        # 表の行番号とタスクの idx は1つずれる（idx は1から）
+        for label, action in (("一時停止", engine.pause), ("再開", engine.resume), ("キャンセル", engine.cancel)):
+            menu.addAction(label, lambda action=action: [action(row + 1) for row in rows])
+        menu.exec(table.viewport().mapToGlobal(pos))
+
     def update_progress(self, percent, message):
         self.progress_bar.setValue(percent)
         self.progress_bar.setFormat(f"{message} - {percent}%")
 
+    # 結果は一覧に表示済みのため、件数のまとめだけを表示する（ダイアログは閉じるまで残す）
     def download_finished(self, results):
-        self.progress_dialog.close()
-        self.log_file.write("\n=== 完了 ===\n")
-        self.log_file.flush()
-        QMessageBox.information(self, "完了", "\n\n".join(results))
+        self.summary_timer.stop()
+        self.task_model.timer.stop()
+        self.task_model.flush()
+        self.progress_bar.setValue(100)
+        self.progress_bar.setFormat("完了")
+        self.summary_label.setText("完了: " + self.task_model.summary())
+        self.progress_dialog.engine = None
+        self.pause_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(False)
+        self.download_btn.setEnabled(True)
+        self.logger.log("=== 完了 ===")
+
+    # ウィンドウ表示後に yt_dlp をバックグラウンドで読み込む
+    def window_shown(self):
+        startup.mark("window_shown")
+        threading.Thread(target=self.preload_yt_dlp, name="preload", daemon=True).start()
+
+    def preload_yt_dlp(self):
+        try:
+            load_yt_dlp()
+            startup.mark("yt_dlp_loaded")
+        except Exception as e:
+            self.logger.log(f"yt_dlp preload failed: {e}", "ERROR")
+        self.logger.log("startup timeline", **startup.marks)
+        # 起動時間の計測用（bench_build.py）: 結果を書き出してすぐに終了する
+        report = os.environ.get("YOUTUBEDL_STARTUP_REPORT")
+        if report:
+            with open(report, "w", encoding="utf-8") as f:
+                json.dump(startup.marks, f)
+            QMetaObject.invokeMethod(QApplication.instance(), "quit", Qt.ConnectionType.QueuedConnection)
+
+    # 実行中に終了する場合はキャンセルし、yt_dlp と ffmpeg が止まるのを待ってから閉じる
+    def closeEvent(self, event):
+        # self.thread は最初のダウンロードを開始するまで QObject.thread() メソッドのまま
+        if isinstance(self.thread, DownloadThread) and self.thread.isRunning():
+            self.thread.engine.cancel()
+            self.thread.wait(30000)
+        self.logger.close()
+        super().closeEvent(event)
 
 #実行☆
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    startup.mark("qapplication")
     window = YouTubeDownloader()
+    startup.mark("window_created")
     window.show()
+    # イベントループが最初の描画を終えてから呼ばれる
+    QTimer.singleShot(0, window.window_shown)
     sys.exit(app.exec())
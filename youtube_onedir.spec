@@ -0,0 +1,50 @@
+# -*- mode: python ; coding: utf-8 -*-
+# onedir ビルド: 起動のたびに一時フォルダへ展開しない（dist/youtube_onedir/ ごと配布する）
+# pyinstaller youtube_onedir.spec
+# UPX 圧縮も起動時の展開コストになるため使わない
+import sys
+sys.path.insert(0, SPECPATH)
+from build_config import EXCLUDES
+
+
+a = Analysis(
+    ['youtube.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=EXCLUDES,
+    noarchive=False,
+    optimize=0,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='youtube_onedir',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=False,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='youtube_onedir',
+)
@@ -0,0 +1,43 @@
+# -*- mode: python ; coding: utf-8 -*-
+# 軽量ビルド: 実行時に使わないモジュールを除外した onefile ビルド
+# pyinstaller youtube_slim.spec
+import sys
+sys.path.insert(0, SPECPATH)
+from build_config import EXCLUDES
+
+
+a = Analysis(
+    ['youtube.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=EXCLUDES,
+    noarchive=False,
+    optimize=0,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    a.binaries,
+    a.datas,
+    [],
+    name='youtube_slim',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=True,
+    upx_exclude=[],
+    runtime_tmpdir=None,
+    console=False,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)